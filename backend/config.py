@@ -1,5 +1,6 @@
 """Configuration management for the application"""
 import os
+import functools
 from pathlib import Path
 from typing import Optional
 import subprocess
@@ -36,8 +37,9 @@ class Config:
     APP_VERSION: str = "1.0.0"
     
     @staticmethod
+    @functools.lru_cache(maxsize=1)
     def get_git_version() -> str:
-        """Get git commit hash for version tracking"""
+        """Get git commit hash for version tracking (resolved once per process)"""
         try:
             result = subprocess.run(
                 ['git', 'rev-parse', '--short', 'HEAD'],
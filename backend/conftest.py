@@ -0,0 +1,20 @@
+"""
+Shared pytest setup for the backend tests
+
+Environment defaults are applied in pytest_configure, before any test
+module imports server, which reads them at import time.
+"""
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+def pytest_configure(config):
+    """Fill in the settings server needs, without overriding real ones"""
+    # Load .env first so its values win over the defaults below
+    load_dotenv(Path(__file__).parent / '.env')
+    # Gemini is stubbed in the tests unless they are marked integration
+    os.environ.setdefault('GEMINI_API_KEY', 'test_key')
+    os.environ.setdefault('JWT_SECRET', 'test_secret_key_for_pytest')
+    # Cheapest bcrypt cost for the hashes the tests create
+    os.environ.setdefault('BCRYPT_ROUNDS', '4')
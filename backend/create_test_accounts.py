@@ -8,7 +8,7 @@ import os
 import bcrypt
 import uuid
 from datetime import datetime, timezone
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -30,29 +30,41 @@ TEST_ACCOUNTS = [
     }
 ]
 
+def hash_password(password: str) -> str:
+    """Hash a password with bcrypt"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
 async def create_test_accounts():
     """Create test accounts in the database"""
     try:
-        # Connect to MongoDB
+        # Connect to MongoDB with PyMongo's native asyncio client (no thread pool)
         mongo_url = os.environ['MONGO_URL']
-        client = AsyncIOMotorClient(mongo_url)
+        client = AsyncMongoClient(mongo_url)
         db = client[os.environ['DB_NAME']]
         
         print("Creating test accounts...")
         
+        # Check which accounts already exist in a single query
+        emails = [account["email"] for account in TEST_ACCOUNTS]
+        existing_emails = {
+            doc["email"] async for doc in db.users.find({"email": {"$in": emails}}, {"email": 1})
+        }
+        
+        new_accounts = []
         for account in TEST_ACCOUNTS:
-            # Check if account already exists
-            existing_user = await db.users.find_one({"email": account["email"]})
-            if existing_user:
+            if account["email"] in existing_emails:
                 print(f"✓ Account {account['email']} already exists")
-                continue
-            
-            # Hash password
-            password_bytes = account["password"].encode('utf-8')
-            hashed_password = bcrypt.hashpw(password_bytes, bcrypt.gensalt()).decode('utf-8')
-            
-            # Create user document
-            user_doc = {
+            else:
+                new_accounts.append(account)
+        
+        # Hash passwords concurrently; bcrypt releases the GIL while hashing
+        hashed_passwords = await asyncio.gather(*[
+            asyncio.to_thread(hash_password, account["password"])
+            for account in new_accounts
+        ])
+        
+        user_docs = [
+            {
                 "id": str(uuid.uuid4()),
                 "name": account["name"],
                 "email": account["email"],
@@ -67,10 +79,14 @@ async def create_test_accounts():
                 "created_at": datetime.now(timezone.utc),
                 "last_active": datetime.now(timezone.utc)
             }
-            
-            # Insert user
-            await db.users.insert_one(user_doc)
-            print(f"✓ Created account: {account['email']} (password: {account['password']})")
+            for account, hashed_password in zip(new_accounts, hashed_passwords)
+        ]
+        
+        # Insert all new users in one round-trip
+        if user_docs:
+            await db.users.insert_many(user_docs, ordered=False)
+            for account in new_accounts:
+                print(f"✓ Created account: {account['email']} (password: {account['password']})")
         
         print("\n" + "="*50)
         print("TEST ACCOUNTS READY!")
@@ -82,7 +98,7 @@ async def create_test_accounts():
             print(f"Password: {account['password']}")
             print("-" * 30)
         
-        client.close()
+        await client.close()
         
     except Exception as e:
         print(f"Error creating test accounts: {e}")
@@ -3,7 +3,8 @@ Database connection module for Supabase
 Replaces previous MongoDB/Motor client
 """
 import os
-from supabase import create_client, Client
+import httpx
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
 from dotenv import load_dotenv
 import logging
 from pathlib import Path
@@ -14,23 +15,70 @@ load_dotenv(ROOT_DIR / '.env')
 
 logger = logging.getLogger(__name__)
 
-# Initialize Supabase Client
+# Supabase credentials
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
 
-if not url or not key:
-    logger.error("Supabase credentials missing in .env")
-    supabase: Client = None
-else:
+# HTTP connection pool shared by every Supabase request
+SUPABASE_POOL_MAX = int(os.environ.get("SUPABASE_POOL_MAX", 20))
+SUPABASE_POOL_KEEPALIVE = int(os.environ.get("SUPABASE_POOL_KEEPALIVE", SUPABASE_POOL_MAX // 2))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.environ.get("SUPABASE_KEEPALIVE_EXPIRY", 1800))
+
+def _create_http_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP client used by the Supabase client"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=SUPABASE_POOL_MAX,
+            max_keepalive_connections=SUPABASE_POOL_KEEPALIVE,
+            keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY
+        )
+    )
+
+_http_client: httpx.AsyncClient = None
+supabase: AsyncClient = None
+
+async def connect():
+    """
+    Initialize the async Supabase client
+
+    The async client has to be created inside the running event loop, so
+    this is called once at application startup.
+    """
+    global _http_client, supabase
+    if supabase is not None:
+        return
+
+    if not url or not key:
+        logger.error("Supabase credentials missing in .env")
+        return
+
     try:
-        supabase: Client = create_client(url, key)
-        logger.info("Supabase client initialized")
+        _http_client = _create_http_client()
+        supabase = await acreate_client(url, key, options=AsyncClientOptions(httpx_client=_http_client))
+        logger.info(f"Supabase client initialized (pool size {SUPABASE_POOL_MAX})")
     except Exception as e:
         logger.error(f"Failed to initialize Supabase client: {e}")
         supabase = None
 
-def get_supabase() -> Client:
+def get_supabase() -> AsyncClient:
     """Get the initialized Supabase client"""
     if not supabase:
         raise Exception("Supabase client not initialized. Check your credentials.")
     return supabase
+
+async def ping() -> bool:
+    """Run a minimal query to check the database is reachable"""
+    try:
+        await get_supabase().table('users').select("id").limit(1).execute()
+        return True
+    except Exception as e:
+        logger.error(f"Supabase readiness check failed: {e}")
+        return False
+
+async def close():
+    """Close the pooled HTTP connections at shutdown"""
+    global _http_client, supabase
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    supabase = None
@@ -4,60 +4,297 @@ Supports PDF, DOCX, TXT, and images (JPG, PNG) with OCR
 """
 
 import logging
-from typing import Optional
+import multiprocessing
+import os
+import functools
+import threading
+from typing import IO, TYPE_CHECKING, Callable, Iterator, List, Optional
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import io
 
-# PDF extraction
-from pypdf import PdfReader
+from blake3 import blake3
+from cachetools import LRUCache
 
-# DOCX extraction
-from docx import Document
-
-# Image OCR
-from PIL import Image
-import pytesseract
+# pypdf, python-docx, Pillow and the OCR bindings are imported inside the
+# extractors so workers that never handle an upload skip their import cost
+if TYPE_CHECKING:
+    from PIL import Image
+    from pypdf import PdfReader
 
 logger = logging.getLogger(__name__)
 
+SUPPORTED_EXTENSIONS = frozenset({'pdf', 'docx', 'doc', 'txt', 'text', 'jpg', 'jpeg', 'png', 'bmp', 'tiff'})
+
+# PDFs with fewer pages than this are extracted serially; below it the
+# cost of shipping the file to worker processes outweighs the speedup
+PDF_PARALLEL_MIN_PAGES = 4
+
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+
+# Extracted text keyed by blake3 digest of the content, so re-uploads of
+# the same file skip PDF parsing and OCR entirely
+EXTRACTION_CACHE_SIZE = 256
+_extraction_cache: LRUCache = LRUCache(maxsize=EXTRACTION_CACHE_SIZE)
+_extraction_cache_lock = threading.Lock()
+
+
+def _file_extension(filename: str) -> str:
+    """Lowercased extension without the dot, or '' when there is none"""
+    _, dot, ext = filename.rpartition('.')
+    return ext.lower() if dot else ''
+
+
+def content_cache(func: Callable[[bytes, str], str]) -> Callable[[bytes, str], str]:
+    """
+    Memoize an extractor by a blake3 fingerprint of the file content
+    
+    The key ignores the filename, so the same bytes re-uploaded under a
+    different name or extension still hit. Error messages are not cached
+    so transient failures can be retried.
+    """
+    @functools.wraps(func)
+    def wrapper(file_content: bytes, filename: str) -> str:
+        key = blake3(file_content).digest()
+        
+        with _extraction_cache_lock:
+            cached = _extraction_cache.get(key)
+        if cached is not None:
+            logger.info(f"Extraction cache hit for {filename}")
+            return cached
+        
+        text = func(file_content, filename)
+        if not text.startswith("Error "):
+            with _extraction_cache_lock:
+                _extraction_cache[key] = text
+        return text
+    
+    return wrapper
+
+
+_tess_api = None
+_tess_lock = threading.Lock()
+
+
+def _binarize(image: "Image.Image") -> "Image.Image":
+    """
+    Convert an image to black and white using Otsu's threshold
+    
+    Doing this in Pillow lets Tesseract skip its own thresholding pass.
+    """
+    gray = image.convert('L')
+    histogram = gray.histogram()
+    total = sum(histogram)
+    weighted_total = sum(i * count for i, count in enumerate(histogram))
+    
+    best_threshold, best_variance = 127, 0.0
+    background, weighted_background = 0, 0
+    for i, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += i * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = i, variance
+    
+    return gray.point(lambda p: 255 if p > best_threshold else 0, mode='1')
+
+
+def _get_tess_api():
+    """Get or create the shared tesserocr API, or None when not installed"""
+    global _tess_api
+    if _tess_api is None:
+        try:
+            # In-process libtesseract bindings; keep the trained data loaded
+            # instead of forking the tesseract binary for every image
+            from tesserocr import PyTessBaseAPI
+        except ImportError:
+            _tess_api = False
+        else:
+            _tess_api = PyTessBaseAPI(lang='eng')
+    return _tess_api or None
+
+
+def _ocr_image(image: "Image.Image") -> str:
+    """Run OCR on an image, in-process when tesserocr is installed"""
+    # PyTessBaseAPI is not thread-safe, so the shared instance is serialised
+    with _tess_lock:
+        api = _get_tess_api()
+        if api is not None:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+    
+    import pytesseract
+    return pytesseract.image_to_string(image)
+
+
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    """
+    Get or create the process pool used for PDF page extraction
+    
+    Workers are spawned rather than forked: the server process already runs
+    threads and a gRPC channel, which a forked child can deadlock on.
+    """
+    global _pdf_executor
+    if _pdf_executor is None:
+        _pdf_executor = ProcessPoolExecutor(
+            max_workers=os.cpu_count() or 1,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pdf_executor
+
+
+def shutdown_pdf_executor():
+    """Stop the PDF worker processes, if any were started"""
+    global _pdf_executor
+    if _pdf_executor is not None:
+        _pdf_executor.shutdown(cancel_futures=True)
+        _pdf_executor = None
+
+
+def _split_pdf(reader: "PdfReader", start: int, stop: int) -> bytes:
+    """Write a contiguous range of pages out as a standalone PDF"""
+    from pypdf import PdfWriter
+    
+    writer = PdfWriter()
+    for page_num in range(start, stop):
+        writer.add_page(reader.pages[page_num])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _extract_pdf_pages(part_content: bytes, first_page: int) -> List[Optional[str]]:
+    """
+    Extract text for every page of a PDF split off by _split_pdf
+    
+    Runs inside worker processes, so it re-opens the part from bytes.
+    
+    Args:
+        part_content: PDF holding only this worker's pages
+        first_page: Index of the part's first page in the original PDF, for logging
+        
+    Returns:
+        Text per page in the part, None for pages that failed
+    """
+    from pypdf import PdfReader
+    
+    reader = PdfReader(io.BytesIO(part_content))
+    texts = []
+    for offset, page in enumerate(reader.pages):
+        try:
+            texts.append(page.extract_text())
+        except Exception as e:
+            logger.warning(f"Error extracting page {first_page + offset + 1}: {e}")
+            texts.append(None)
+    return texts
+
 
-def extract_text_from_pdf(file_content: bytes) -> str:
+def _iter_pdf_page_texts(reader: "PdfReader") -> Iterator[Optional[str]]:
+    """
+    Yield page texts in order, fanning out across processes for large PDFs
+    
+    Each worker is sent a PDF of only its own pages, so the upload is not
+    copied to every process in full.
+    """
+    num_pages = len(reader.pages)
+    
+    if num_pages < PDF_PARALLEL_MIN_PAGES:
+        for page_num, page in enumerate(reader.pages):
+            try:
+                yield page.extract_text()
+            except Exception as e:
+                logger.warning(f"Error extracting page {page_num + 1}: {e}")
+                yield None
+        return
+    
+    workers = min(os.cpu_count() or 1, num_pages)
+    step = -(-num_pages // workers)  # ceiling division
+    starts = range(0, num_pages, step)
+    parts = [_split_pdf(reader, start, min(start + step, num_pages)) for start in starts]
+    
+    # map() returns results in submission order, preserving page order
+    for texts in _get_pdf_executor().map(_extract_pdf_pages, parts, starts):
+        yield from texts
+
+
+def extract_text_from_pdf(file_content: bytes, out: Optional[IO[str]] = None) -> str:
     """
     Extract text from PDF file
     
+    Pages are written to the output buffer as they are extracted, so the
+    full text is never held as a list of pages plus a joined copy.
+    
     Args:
         file_content: PDF file bytes
+        out: Optional writable text buffer to stream pages into
         
     Returns:
-        Extracted text
+        Extracted text, or an empty string when ``out`` is supplied
     """
     try:
+        from pypdf import PdfReader
+        
+        owns_buffer = out is None
+        if owns_buffer:
+            out = io.StringIO()
+        
         pdf_file = io.BytesIO(file_content)
         reader = PdfReader(pdf_file)
         
-        text_parts = []
-        for page_num, page in enumerate(reader.pages):
-            try:
-                text = page.extract_text()
-                if text:
-                    text_parts.append(f"[Page {page_num + 1}]\n{text}")
-            except Exception as e:
-                logger.warning(f"Error extracting page {page_num + 1}: {e}")
+        chars = 0
+        for page_num, text in enumerate(_iter_pdf_page_texts(reader)):
+            if text:
+                if chars:
+                    chars += out.write("\n\n")
+                chars += out.write(f"[Page {page_num + 1}]\n")
+                chars += out.write(text)
         
-        extracted_text = "\n\n".join(text_parts)
-        logger.info(f"Extracted {len(extracted_text)} characters from PDF ({len(reader.pages)} pages)")
+        logger.info(f"Extracted {chars} characters from PDF ({len(reader.pages)} pages)")
         
-        return extracted_text
+        return out.getvalue() if owns_buffer else ""
         
     except Exception as e:
         logger.error(f"Error extracting PDF: {e}")
         return f"Error extracting PDF: {str(e)}"
 
 
+# Clark-notation tags, equivalent to docx.oxml.ns.qn('w:p') etc.
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P = _W_NS + "p"
+_W_T = _W_NS + "t"
+_W_TBL = _W_NS + "tbl"
+_W_TR = _W_NS + "tr"
+_W_TC = _W_NS + "tc"
+
+
+def _docx_paragraph_text(el) -> str:
+    """Concatenate the text runs of a <w:p> element"""
+    return "".join(t.text or "" for t in el.iter(_W_T))
+
+
+def _docx_row_text(el) -> str:
+    """Render a <w:tr> element as pipe-separated cell text"""
+    return " | ".join(
+        "\n".join(_docx_paragraph_text(p) for p in cell.iterchildren(_W_P)).strip()
+        for cell in el.iterchildren(_W_TC)
+    )
+
+
 def extract_text_from_docx(file_content: bytes) -> str:
     """
     Extract text from DOCX file
     
+    Walks the document body once in document order, reading the XML
+    directly rather than wrapping every paragraph and cell in python-docx
+    objects.
+    
     Args:
         file_content: DOCX file bytes
         
@@ -65,24 +302,30 @@ def extract_text_from_docx(file_content: bytes) -> str:
         Extracted text
     """
     try:
+        from docx import Document
+        
         docx_file = io.BytesIO(file_content)
         doc = Document(docx_file)
         
-        text_parts = []
+        out = io.StringIO()
         
-        # Extract paragraphs
-        for para in doc.paragraphs:
-            if para.text.strip():
-                text_parts.append(para.text)
+        def write_part(part: str):
+            if out.tell():
+                out.write("\n\n")
+            out.write(part)
         
-        # Extract tables
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = " | ".join(cell.text.strip() for cell in row.cells)
-                if row_text.strip():
-                    text_parts.append(row_text)
+        for el in doc.element.body.iterchildren():
+            if el.tag == _W_P:
+                para_text = _docx_paragraph_text(el)
+                if para_text.strip():
+                    write_part(para_text)
+            elif el.tag == _W_TBL:
+                for row in el.iterchildren(_W_TR):
+                    row_text = _docx_row_text(row)
+                    if row_text.strip():
+                        write_part(row_text)
         
-        extracted_text = "\n\n".join(text_parts)
+        extracted_text = out.getvalue()
         logger.info(f"Extracted {len(extracted_text)} characters from DOCX")
         
         return extracted_text
@@ -92,26 +335,30 @@ def extract_text_from_docx(file_content: bytes) -> str:
         return f"Error extracting DOCX: {str(e)}"
 
 
-def extract_text_from_image(file_content: bytes, filename: str = "") -> str:
+def extract_text_from_image(file_content: bytes, filename: str = "", preprocess: bool = True) -> str:
     """
     Extract text from image using OCR (JPG, PNG, etc.)
     
     Args:
         file_content: Image file bytes
         filename: Original filename (for logging)
+        preprocess: Binarize the image before OCR; disable for clean images
         
     Returns:
         Extracted text via OCR
     """
     try:
+        from PIL import Image
+        
         image = Image.open(io.BytesIO(file_content))
         
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
+        if preprocess:
+            image = _binarize(image)
+        elif image.mode not in ('RGB', 'L'):
             image = image.convert('RGB')
         
         # Perform OCR
-        text = pytesseract.image_to_string(image)
+        text = _ocr_image(image)
         
         logger.info(f"Extracted {len(text)} characters from image {filename} using OCR")
         
@@ -151,6 +398,21 @@ def extract_text_from_txt(file_content: bytes) -> str:
         return f"Error extracting text: {str(e)}"
 
 
+@content_cache
+def _extract_supported_file(file_content: bytes, filename: str) -> str:
+    """Dispatch a supported file to its extractor"""
+    file_ext = _file_extension(filename)
+    
+    if file_ext == 'pdf':
+        return extract_text_from_pdf(file_content)
+    elif file_ext == 'docx':
+        return extract_text_from_docx(file_content)
+    elif file_ext in ['txt', 'text']:
+        return extract_text_from_txt(file_content)
+    else:
+        return extract_text_from_image(file_content, filename)
+
+
 def extract_text_from_file(file_content: bytes, filename: str) -> str:
     """
     Extract text from any supported file type
@@ -162,22 +424,17 @@ def extract_text_from_file(file_content: bytes, filename: str) -> str:
     Returns:
         Extracted text
     """
-    file_ext = filename.lower().split('.')[-1] if '.' in filename else ''
+    file_ext = _file_extension(filename)
     
-    if file_ext == 'pdf':
-        return extract_text_from_pdf(file_content)
-    elif file_ext in ['docx', 'doc']:
-        if file_ext == 'doc':
-            logger.warning("Legacy .doc format detected. Only .docx is fully supported.")
-            return "Legacy .doc format is not supported. Please convert to .docx format."
-        return extract_text_from_docx(file_content)
-    elif file_ext in ['txt', 'text']:
-        return extract_text_from_txt(file_content)
-    elif file_ext in ['jpg', 'jpeg', 'png', 'bmp', 'tiff']:
-        return extract_text_from_image(file_content, filename)
-    else:
+    if file_ext == 'doc':
+        logger.warning("Legacy .doc format detected. Only .docx is fully supported.")
+        return "Legacy .doc format is not supported. Please convert to .docx format."
+    if file_ext not in SUPPORTED_EXTENSIONS:
         logger.warning(f"Unsupported file type: {file_ext}")
         return f"Unsupported file type: {file_ext}. Supported types: PDF, DOCX, TXT, JPG, PNG"
+    
+    # Fingerprint lookup happens before extension dispatch
+    return _extract_supported_file(file_content, filename)
 
 
 def validate_file_type(filename: str) -> bool:
@@ -190,6 +447,4 @@ def validate_file_type(filename: str) -> bool:
     Returns:
         True if supported, False otherwise
     """
-    supported_extensions = ['pdf', 'docx', 'doc', 'txt', 'text', 'jpg', 'jpeg', 'png', 'bmp', 'tiff']
-    file_ext = filename.lower().split('.')[-1] if '.' in filename else ''
-    return file_ext in supported_extensions
+    return _file_extension(filename) in SUPPORTED_EXTENSIONS
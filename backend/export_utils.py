@@ -4,67 +4,145 @@ Supports PDF, DOCX, and TXT exports for chats and document analyses
 """
 
 import logging
-from typing import List, Dict, Any
+import functools
+import sys
+from typing import Iterator, List, Dict, Any, Optional
 from datetime import datetime
 import io
 
-# PDF generation
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
+import orjson
 
-# DOCX generation
-from docx import Document
-from docx.shared import Pt, RGBColor, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+# reportlab and python-docx are imported inside the exporters so workers
+# that never export skip their import cost
 
 logger = logging.getLogger(__name__)
 
+def _decode_json(value: Any) -> Any:
+    """Decode a JSONB column that arrived as a JSON string"""
+    if isinstance(value, (str, bytes)):
+        return orjson.loads(value)
+    return value
 
-def export_chat_to_pdf(chat_data: Dict[str, Any]) -> bytes:
+
+# Approximate size of each chunk yielded by the streaming text exports
+TXT_STREAM_CHUNK_SIZE = 64 * 1024
+
+_DATE_FORMAT = '%B %d, %Y at %I:%M %p'
+_TIME_FORMAT = '%I:%M %p'
+
+# datetime.fromisoformat accepts a trailing 'Z' natively from Python 3.11
+_FROMISOFORMAT_ACCEPTS_Z = sys.version_info >= (3, 11)
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_timestamp(value: str, fmt: str) -> Optional[str]:
+    """Format an ISO-8601 timestamp string, or return None if it cannot be parsed"""
+    try:
+        if not _FROMISOFORMAT_ACCEPTS_Z and value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        return datetime.fromisoformat(value).strftime(fmt)
+    except ValueError:
+        return None
+
+
+# Escapes text for reportlab Paragraph markup in a single pass
+_PDF_ESCAPE = str.maketrans({'<': '&lt;', '>': '&gt;', '\n': '<br/>'})
+
+
+@functools.lru_cache(maxsize=None)
+def _pdf_styles() -> Dict[str, Any]:
     """
-    Export chat to PDF format
+    Build the PDF paragraph styles once per process
     
-    Args:
-        chat_data: Chat data including messages
-        
-    Returns:
-        PDF file bytes
+    getSampleStyleSheet() allocates every sample style on each call, so the
+    stylesheet and the custom styles derived from it are shared across exports.
     """
-    try:
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+    
+    styles = getSampleStyleSheet()
+    return {
+        'normal': styles['Normal'],
+        'title': ParagraphStyle(
             'CustomTitle',
             parent=styles['Heading1'],
             fontSize=18,
             textColor='#059669',  # Green theme
             spaceAfter=30,
             alignment=TA_CENTER
-        )
-        
-        heading_style = ParagraphStyle(
+        ),
+        'heading': ParagraphStyle(
             'CustomHeading',
             parent=styles['Heading2'],
             fontSize=12,
             textColor='#047857',
             spaceAfter=10,
             spaceBefore=15
-        )
-        
-        message_style = ParagraphStyle(
+        ),
+        'message': ParagraphStyle(
             'MessageStyle',
             parent=styles['Normal'],
             fontSize=10,
             spaceAfter=12,
             leftIndent=20
-        )
+        ),
+        'section': ParagraphStyle(
+            'SectionStyle',
+            parent=styles['Heading2'],
+            fontSize=14,
+            textColor='#047857',
+            spaceAfter=15,
+            spaceBefore=20
+        ),
+    }
+
+
+def _new_pdf_document(buffer: io.BytesIO):
+    """Create a PDF document template writing into buffer"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate
+    
+    return SimpleDocTemplate(buffer, pagesize=letter)
+
+
+@functools.lru_cache(maxsize=None)
+def _docx_template_bytes() -> bytes:
+    """Serialize an empty python-docx document once per process"""
+    from docx import Document
+    
+    buffer = io.BytesIO()
+    Document().save(buffer)
+    return buffer.getvalue()
+
+
+def _new_docx_document():
+    """Create a DOCX document cloned from the cached empty template"""
+    from docx import Document
+    
+    return Document(io.BytesIO(_docx_template_bytes()))
+
+
+def export_chat_to_pdf(chat_data: Dict[str, Any]) -> bytes:
+    """
+    Export chat to PDF format
+    
+    Args:
+        chat_data: Chat data including messages
+        
+    Returns:
+        PDF file bytes
+    """
+    try:
+        from reportlab.lib.units import inch
+        from reportlab.platypus import Paragraph, Spacer
+        
+        buffer = io.BytesIO()
+        doc = _new_pdf_document(buffer)
+        story = []
+        styles = _pdf_styles()
+        title_style = styles['title']
+        heading_style = styles['heading']
+        message_style = styles['message']
         
         # Title
         title = Paragraph("Pleader AI - Chat Export", title_style)
@@ -75,18 +153,14 @@ def export_chat_to_pdf(chat_data: Dict[str, Any]) -> bytes:
         chat_title = chat_data.get('title', 'Untitled Chat')
         created_at = chat_data.get('created_at', '')
         if isinstance(created_at, str):
-            try:
-                created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                created_at = created_at.strftime('%B %d, %Y at %I:%M %p')
-            except:
-                pass
+            created_at = _format_timestamp(created_at, _DATE_FORMAT) or created_at
         
-        info = Paragraph(f"<b>Chat:</b> {chat_title}<br/><b>Date:</b> {created_at}", styles['Normal'])
+        info = Paragraph(f"<b>Chat:</b> {chat_title}<br/><b>Date:</b> {created_at}", styles['normal'])
         story.append(info)
         story.append(Spacer(1, 0.3*inch))
         
         # Messages
-        messages = chat_data.get('messages', [])
+        messages = _decode_json(chat_data.get('messages') or [])
         for i, msg in enumerate(messages):
             sender = msg.get('sender', 'user')
             content = msg.get('content', '')
@@ -94,11 +168,7 @@ def export_chat_to_pdf(chat_data: Dict[str, Any]) -> bytes:
             
             # Format timestamp
             if isinstance(timestamp, str) and timestamp:
-                try:
-                    ts = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                    timestamp = ts.strftime('%I:%M %p')
-                except:
-                    timestamp = ''
+                timestamp = _format_timestamp(timestamp, _TIME_FORMAT) or ''
             
             # Sender heading
             sender_label = "You" if sender == "user" else "Pleader AI"
@@ -106,7 +176,7 @@ def export_chat_to_pdf(chat_data: Dict[str, Any]) -> bytes:
             story.append(Paragraph(heading_text, heading_style))
             
             # Message content
-            content_safe = content.replace('<', '&lt;').replace('>', '&gt;').replace('\n', '<br/>')
+            content_safe = content.translate(_PDF_ESCAPE)
             story.append(Paragraph(content_safe, message_style))
             story.append(Spacer(1, 0.1*inch))
         
@@ -133,7 +203,10 @@ def export_chat_to_docx(chat_data: Dict[str, Any]) -> bytes:
         DOCX file bytes
     """
     try:
-        doc = Document()
+        from docx.shared import RGBColor, Inches
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        
+        doc = _new_docx_document()
         
         # Title
         title = doc.add_heading('Pleader AI - Chat Export', level=0)
@@ -145,11 +218,7 @@ def export_chat_to_docx(chat_data: Dict[str, Any]) -> bytes:
         chat_title = chat_data.get('title', 'Untitled Chat')
         created_at = chat_data.get('created_at', '')
         if isinstance(created_at, str):
-            try:
-                created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                created_at = created_at.strftime('%B %d, %Y at %I:%M %p')
-            except:
-                pass
+            created_at = _format_timestamp(created_at, _DATE_FORMAT) or created_at
         
         info_para = doc.add_paragraph()
         info_para.add_run('Chat: ').bold = True
@@ -160,7 +229,7 @@ def export_chat_to_docx(chat_data: Dict[str, Any]) -> bytes:
         doc.add_paragraph()  # Spacer
         
         # Messages
-        messages = chat_data.get('messages', [])
+        messages = _decode_json(chat_data.get('messages') or [])
         for msg in messages:
             sender = msg.get('sender', 'user')
             content = msg.get('content', '')
@@ -168,11 +237,7 @@ def export_chat_to_docx(chat_data: Dict[str, Any]) -> bytes:
             
             # Format timestamp
             if isinstance(timestamp, str) and timestamp:
-                try:
-                    ts = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                    timestamp = ts.strftime('%I:%M %p')
-                except:
-                    timestamp = ''
+                timestamp = _format_timestamp(timestamp, _TIME_FORMAT) or ''
             
             # Sender heading
             sender_label = "You" if sender == "user" else "Pleader AI"
@@ -200,6 +265,45 @@ def export_chat_to_docx(chat_data: Dict[str, Any]) -> bytes:
         raise Exception(f"Failed to export chat to DOCX: {str(e)}")
 
 
+def _chat_txt_lines(chat_data: Dict[str, Any], messages: List[Dict[str, Any]]) -> Iterator[str]:
+    """Yield the lines of a plain text chat export"""
+    yield "=" * 60
+    yield "PLEADER AI - CHAT EXPORT"
+    yield "=" * 60
+    yield ""
+    
+    # Chat info
+    chat_title = chat_data.get('title', 'Untitled Chat')
+    created_at = chat_data.get('created_at', '')
+    if isinstance(created_at, str):
+        created_at = _format_timestamp(created_at, _DATE_FORMAT) or created_at
+    
+    yield f"Chat: {chat_title}"
+    yield f"Date: {created_at}"
+    yield ""
+    yield "-" * 60
+    yield ""
+    
+    # Messages
+    for msg in messages:
+        sender = msg.get('sender', 'user')
+        content = msg.get('content', '')
+        timestamp = msg.get('timestamp', '')
+        
+        # Format timestamp
+        if isinstance(timestamp, str) and timestamp:
+            timestamp = _format_timestamp(timestamp, _TIME_FORMAT) or ''
+        
+        # Sender heading
+        sender_label = "YOU" if sender == "user" else "PLEADER AI"
+        heading = f"{sender_label} {f'({timestamp})' if timestamp else ''}"
+        yield heading
+        yield "-" * len(heading)
+        yield content
+        yield ""
+        yield ""
+
+
 def export_chat_to_txt(chat_data: Dict[str, Any]) -> str:
     """
     Export chat to plain text format
@@ -211,53 +315,8 @@ def export_chat_to_txt(chat_data: Dict[str, Any]) -> str:
         Plain text string
     """
     try:
-        lines = []
-        lines.append("=" * 60)
-        lines.append("PLEADER AI - CHAT EXPORT")
-        lines.append("=" * 60)
-        lines.append("")
-        
-        # Chat info
-        chat_title = chat_data.get('title', 'Untitled Chat')
-        created_at = chat_data.get('created_at', '')
-        if isinstance(created_at, str):
-            try:
-                created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                created_at = created_at.strftime('%B %d, %Y at %I:%M %p')
-            except:
-                pass
-        
-        lines.append(f"Chat: {chat_title}")
-        lines.append(f"Date: {created_at}")
-        lines.append("")
-        lines.append("-" * 60)
-        lines.append("")
-        
-        # Messages
-        messages = chat_data.get('messages', [])
-        for msg in messages:
-            sender = msg.get('sender', 'user')
-            content = msg.get('content', '')
-            timestamp = msg.get('timestamp', '')
-            
-            # Format timestamp
-            if isinstance(timestamp, str) and timestamp:
-                try:
-                    ts = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                    timestamp = ts.strftime('%I:%M %p')
-                except:
-                    timestamp = ''
-            
-            # Sender heading
-            sender_label = "YOU" if sender == "user" else "PLEADER AI"
-            heading = f"{sender_label} {f'({timestamp})' if timestamp else ''}"
-            lines.append(heading)
-            lines.append("-" * len(heading))
-            lines.append(content)
-            lines.append("")
-            lines.append("")
-        
-        text = "\n".join(lines)
+        messages = _decode_json(chat_data.get('messages') or [])
+        text = "\n".join(_chat_txt_lines(chat_data, messages))
         logger.info(f"Exported chat to TXT with {len(messages)} messages")
         return text
         
@@ -266,6 +325,44 @@ def export_chat_to_txt(chat_data: Dict[str, Any]) -> str:
         raise Exception(f"Failed to export chat to TXT: {str(e)}")
 
 
+def _encode_lines(lines: Iterator[str]) -> Iterator[bytes]:
+    """
+    Join lines with newlines and encode them as UTF-8, in chunks
+    
+    Produces the same bytes as "\n".join(lines).encode('utf-8'), but yields
+    them about TXT_STREAM_CHUNK_SIZE at a time instead of building one string.
+    """
+    parts = []
+    size = 0
+    separator = ""
+    for line in lines:
+        parts.append(separator)
+        parts.append(line)
+        separator = "\n"
+        size += len(line) + 1
+        if size >= TXT_STREAM_CHUNK_SIZE:
+            yield "".join(parts).encode('utf-8')
+            parts = []
+            size = 0
+    if parts:
+        yield "".join(parts).encode('utf-8')
+
+
+def stream_chat_to_txt(chat_data: Dict[str, Any]) -> Iterator[bytes]:
+    """
+    Export chat to plain text format, as a stream of encoded chunks
+    
+    Args:
+        chat_data: Chat data including messages
+        
+    Returns:
+        Iterator of UTF-8 encoded chunks of the export
+    """
+    messages = _decode_json(chat_data.get('messages') or [])
+    yield from _encode_lines(_chat_txt_lines(chat_data, messages))
+    logger.info(f"Exported chat to TXT with {len(messages)} messages")
+
+
 def export_analysis_to_pdf(analysis_data: Dict[str, Any]) -> bytes:
     """
     Export document analysis to PDF format
@@ -277,29 +374,15 @@ def export_analysis_to_pdf(analysis_data: Dict[str, Any]) -> bytes:
         PDF file bytes
     """
     try:
+        from reportlab.lib.units import inch
+        from reportlab.platypus import Paragraph, Spacer
+        
         buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
+        doc = _new_pdf_document(buffer)
         story = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            textColor='#059669',
-            spaceAfter=30,
-            alignment=TA_CENTER
-        )
-        
-        section_style = ParagraphStyle(
-            'SectionStyle',
-            parent=styles['Heading2'],
-            fontSize=14,
-            textColor='#047857',
-            spaceAfter=15,
-            spaceBefore=20
-        )
+        styles = _pdf_styles()
+        title_style = styles['title']
+        section_style = styles['section']
         
         # Title
         title = Paragraph("Pleader AI - Document Analysis", title_style)
@@ -310,18 +393,14 @@ def export_analysis_to_pdf(analysis_data: Dict[str, Any]) -> bytes:
         filename = analysis_data.get('filename', 'Unknown')
         uploaded_at = analysis_data.get('uploaded_at', '')
         if isinstance(uploaded_at, str):
-            try:
-                uploaded_at = datetime.fromisoformat(uploaded_at.replace('Z', '+00:00'))
-                uploaded_at = uploaded_at.strftime('%B %d, %Y at %I:%M %p')
-            except:
-                pass
+            uploaded_at = _format_timestamp(uploaded_at, _DATE_FORMAT) or uploaded_at
         
-        info = Paragraph(f"<b>Document:</b> {filename}<br/><b>Analyzed:</b> {uploaded_at}", styles['Normal'])
+        info = Paragraph(f"<b>Document:</b> {filename}<br/><b>Analyzed:</b> {uploaded_at}", styles['normal'])
         story.append(info)
         story.append(Spacer(1, 0.3*inch))
         
         # Analysis result
-        analysis = analysis_data.get('analysis_result', {})
+        analysis = _decode_json(analysis_data.get('analysis_result') or {})
         
         # Full analysis
         full_analysis = analysis.get('full_analysis', 'No analysis available')
@@ -331,8 +410,8 @@ def export_analysis_to_pdf(analysis_data: Dict[str, Any]) -> bytes:
         paragraphs = full_analysis.split('\n\n')
         for para in paragraphs:
             if para.strip():
-                para_safe = para.replace('<', '&lt;').replace('>', '&gt;').replace('\n', '<br/>')
-                story.append(Paragraph(para_safe, styles['Normal']))
+                para_safe = para.translate(_PDF_ESCAPE)
+                story.append(Paragraph(para_safe, styles['normal']))
                 story.append(Spacer(1, 0.1*inch))
         
         # Build PDF
@@ -358,7 +437,10 @@ def export_analysis_to_docx(analysis_data: Dict[str, Any]) -> bytes:
         DOCX file bytes
     """
     try:
-        doc = Document()
+        from docx.shared import RGBColor
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        
+        doc = _new_docx_document()
         
         # Title
         title = doc.add_heading('Pleader AI - Document Analysis', level=0)
@@ -370,11 +452,7 @@ def export_analysis_to_docx(analysis_data: Dict[str, Any]) -> bytes:
         filename = analysis_data.get('filename', 'Unknown')
         uploaded_at = analysis_data.get('uploaded_at', '')
         if isinstance(uploaded_at, str):
-            try:
-                uploaded_at = datetime.fromisoformat(uploaded_at.replace('Z', '+00:00'))
-                uploaded_at = uploaded_at.strftime('%B %d, %Y at %I:%M %p')
-            except:
-                pass
+            uploaded_at = _format_timestamp(uploaded_at, _DATE_FORMAT) or uploaded_at
         
         info_para = doc.add_paragraph()
         info_para.add_run('Document: ').bold = True
@@ -385,7 +463,7 @@ def export_analysis_to_docx(analysis_data: Dict[str, Any]) -> bytes:
         doc.add_paragraph()
         
         # Analysis result
-        analysis = analysis_data.get('analysis_result', {})
+        analysis = _decode_json(analysis_data.get('analysis_result') or {})
         full_analysis = analysis.get('full_analysis', 'No analysis available')
         
         doc.add_heading('Analysis', level=1)
@@ -409,6 +487,36 @@ def export_analysis_to_docx(analysis_data: Dict[str, Any]) -> bytes:
         raise Exception(f"Failed to export analysis to DOCX: {str(e)}")
 
 
+def _analysis_txt_lines(analysis_data: Dict[str, Any]) -> Iterator[str]:
+    """Yield the lines of a plain text analysis export"""
+    yield "=" * 60
+    yield "PLEADER AI - DOCUMENT ANALYSIS"
+    yield "=" * 60
+    yield ""
+    
+    # Document info
+    filename = analysis_data.get('filename', 'Unknown')
+    uploaded_at = analysis_data.get('uploaded_at', '')
+    if isinstance(uploaded_at, str):
+        uploaded_at = _format_timestamp(uploaded_at, _DATE_FORMAT) or uploaded_at
+    
+    yield f"Document: {filename}"
+    yield f"Analyzed: {uploaded_at}"
+    yield ""
+    yield "-" * 60
+    yield ""
+    
+    # Analysis
+    analysis = _decode_json(analysis_data.get('analysis_result') or {})
+    full_analysis = analysis.get('full_analysis', 'No analysis available')
+    
+    yield "ANALYSIS"
+    yield "-" * 60
+    yield ""
+    yield full_analysis
+    yield ""
+
+
 def export_analysis_to_txt(analysis_data: Dict[str, Any]) -> str:
     """
     Export document analysis to plain text format
@@ -420,39 +528,8 @@ def export_analysis_to_txt(analysis_data: Dict[str, Any]) -> str:
         Plain text string
     """
     try:
-        lines = []
-        lines.append("=" * 60)
-        lines.append("PLEADER AI - DOCUMENT ANALYSIS")
-        lines.append("=" * 60)
-        lines.append("")
-        
-        # Document info
         filename = analysis_data.get('filename', 'Unknown')
-        uploaded_at = analysis_data.get('uploaded_at', '')
-        if isinstance(uploaded_at, str):
-            try:
-                uploaded_at = datetime.fromisoformat(uploaded_at.replace('Z', '+00:00'))
-                uploaded_at = uploaded_at.strftime('%B %d, %Y at %I:%M %p')
-            except:
-                pass
-        
-        lines.append(f"Document: {filename}")
-        lines.append(f"Analyzed: {uploaded_at}")
-        lines.append("")
-        lines.append("-" * 60)
-        lines.append("")
-        
-        # Analysis
-        analysis = analysis_data.get('analysis_result', {})
-        full_analysis = analysis.get('full_analysis', 'No analysis available')
-        
-        lines.append("ANALYSIS")
-        lines.append("-" * 60)
-        lines.append("")
-        lines.append(full_analysis)
-        lines.append("")
-        
-        text = "\n".join(lines)
+        text = "\n".join(_analysis_txt_lines(analysis_data))
         logger.info(f"Exported analysis to TXT for {filename}")
         return text
         
@@ -1,106 +1,312 @@
-"""Middleware for rate limiting, security, and request tracking"""
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from collections import defaultdict
-from datetime import datetime, timedelta
+"""
+Middleware for rate limiting, security, and request tracking
+
+Written as plain ASGI callables rather than BaseHTTPMiddleware, so responses
+pass straight through without being wrapped in an extra task and stream.
+"""
+from fastapi.responses import ORJSONResponse
+from typing import Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from collections import defaultdict, deque
+import os
 import time
+import functools
+import uuid
 import logging
+import logging.handlers
+import queue
+import threading
+import orjson
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
 
 logger = logging.getLogger(__name__)
 
+_log_listener = None
+
+# "json" emits one JSON object per log line; anything else keeps plain text
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+
+# Attributes every LogRecord has; anything else was passed via extra={...}
+_LOG_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as JSON, including fields passed via extra={...}"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _LOG_RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records as they are, leaving all formatting to the listener"""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() formats the message and drops exc_info and args,
+        # which would hide tracebacks from JsonFormatter
+        return record
+
+def start_log_queue():
+    """
+    Hand log records to a background thread for formatting and output
+    
+    The root logger's handlers are moved behind a QueueListener. Records are
+    enqueued unformatted, so request handlers only pay for an enqueue while
+    the listener thread formats and writes them. With LOG_FORMAT=json those
+    handlers also switch to JsonFormatter.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+    
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+        if LOG_FORMAT == 'json':
+            handler.setFormatter(JsonFormatter())
+    
+    log_queue = queue.SimpleQueue()
+    root.addHandler(_RecordQueueHandler(log_queue))
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+
+def stop_log_queue():
+    """Flush queued log records and stop the background thread"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+# Number of lock stripes guarding the in-memory rate limiter state
+RATE_LIMIT_LOCK_STRIPES = 64
+
 # In-memory rate limiting (for production, use Redis)
 class RateLimiter:
     def __init__(self):
-        self.requests = defaultdict(list)
+        self.requests = defaultdict(deque)
+        # Striped locks: keys hash onto one of a fixed set of locks, so
+        # concurrent requests for different clients rarely contend
+        self._locks = [threading.Lock() for _ in range(RATE_LIMIT_LOCK_STRIPES)]
         self.limits = {
             '/api/rag/query': (10, 60),  # 10 requests per minute
             '/api/chat/send': (20, 60),   # 20 requests per minute  
             '/api/documents/analyze': (5, 60),  # 5 requests per minute
             'default': (100, 60)  # 100 requests per minute for other endpoints
         }
+        # Endpoint prefixes checked longest first, so the most specific rule wins
+        self._prefixes = sorted(
+            (path for path in self.limits if path != 'default'),
+            key=len,
+            reverse=True
+        )
+        self.limit_for = functools.lru_cache(maxsize=1024)(self._resolve_limit)
+    
+    def _resolve_limit(self, endpoint: str) -> Tuple[str, int, int]:
+        """
+        Find the rate limit rule for a request path
+        
+        Paths below a limited endpoint (e.g. with an ID suffix) share its
+        bucket. Other paths get the default limit in a bucket of their own.
+        
+        Returns:
+            Tuple of (bucket, limit, window in seconds)
+        """
+        for prefix in self._prefixes:
+            if endpoint == prefix or endpoint.startswith(prefix + '/'):
+                return (prefix, *self.limits[prefix])
+        return (endpoint, *self.limits['default'])
     
     def is_allowed(self, client_id: str, endpoint: str) -> bool:
         """Check if request is allowed based on rate limits"""
-        now = time.time()
+        now = time.monotonic()
         
         # Get limit for this endpoint
-        limit, window = self.limits.get(endpoint, self.limits['default'])
+        bucket, limit, window = self.limit_for(endpoint)
         
-        # Clean old requests
-        key = f"{client_id}:{endpoint}"
-        self.requests[key] = [
-            req_time for req_time in self.requests[key]
-            if now - req_time < window
-        ]
-        
-        # Check if limit exceeded
-        if len(self.requests[key]) >= limit:
-            return False
-        
-        # Add current request
-        self.requests[key].append(now)
-        return True
+        key = f"{client_id}:{bucket}"
+        with self._locks[hash(key) % RATE_LIMIT_LOCK_STRIPES]:
+            # Drop expired requests from the front; timestamps are in arrival order
+            timestamps = self.requests[key]
+            while timestamps and now - timestamps[0] >= window:
+                timestamps.popleft()
+            
+            # Check if limit exceeded
+            if len(timestamps) >= limit:
+                return False
+            
+            # Add current request
+            timestamps.append(now)
+            return True
+    
+    async def allow(self, client_id: str, endpoint: str) -> bool:
+        """Check a request from async code"""
+        return self.is_allowed(client_id, endpoint)
 
-rate_limiter = RateLimiter()
+# Atomic sliding window over a sorted set of request timestamps (ms).
+# Uses the Redis server clock so every replica agrees on the window.
+SLIDING_WINDOW_LUA = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('PEXPIRE', KEYS[1], window)
+return 1
+"""
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+class RedisRateLimiter(RateLimiter):
+    """Rate limiter shared across workers and replicas through Redis"""
+    def __init__(self, redis_url: str):
+        super().__init__()
+        self.redis = aioredis.from_url(redis_url)
+        self._sliding_window = self.redis.register_script(SLIDING_WINDOW_LUA)
+    
+    async def allow(self, client_id: str, endpoint: str) -> bool:
+        """Check and record a request atomically in Redis"""
+        bucket, limit, window = self.limit_for(endpoint)
+        key = f"ratelimit:{client_id}:{bucket}"
+        try:
+            allowed = await self._sliding_window(
+                keys=[key],
+                args=[window * 1000, limit, uuid.uuid4().hex]
+            )
+            return bool(allowed)
+        except RedisError as e:
+            # Fall back to this worker's in-memory window rather than failing requests
+            logger.error(f"Redis rate limiter unavailable: {e}")
+            return self.is_allowed(client_id, endpoint)
+
+REDIS_URL = os.environ.get('REDIS_URL')
+rate_limiter = RedisRateLimiter(REDIS_URL) if REDIS_URL else RateLimiter()
+
+def _client_host(scope: Scope) -> str:
+    """Client IP address of an ASGI connection"""
+    client = scope.get('client')
+    return client[0] if client else 'unknown'
+
+class RateLimitMiddleware:
+    """Reject requests over the per-client rate limit with a 429"""
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
         # Get client identifier (IP address or user ID from token)
-        client_id = request.client.host
+        client_id = _client_host(scope)
         
         # Extract endpoint path
-        path = request.url.path
+        path = scope['path']
         
         # Check rate limit
-        if not rate_limiter.is_allowed(client_id, path):
-            logger.warning(f"Rate limit exceeded for {client_id} on {path}")
-            raise HTTPException(
-                status_code=429,
-                detail="Too many requests. Please try again later."
+        if not await rate_limiter.allow(client_id, path):
+            logger.warning("Rate limit exceeded for %s on %s", client_id, path)
+            response = ORJSONResponse(
+                {"detail": "Too many requests. Please try again later."},
+                status_code=429
             )
+            await response(scope, receive, send)
+            return
         
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
+
+# Encoded once; appended to every response start message
+SECURITY_HEADERS = [
+    (b'x-content-type-options', b'nosniff'),
+    (b'x-frame-options', b'DENY'),
+    (b'x-xss-protection', b'1; mode=block'),
+    (b'strict-transport-security', b'max-age=31536000; includeSubDomains'),
+]
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class SecurityHeadersMiddleware:
     """Add security headers to all responses"""
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
         
-        # Add security headers
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'DENY'
-        response.headers['X-XSS-Protection'] = '1; mode=block'
-        response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
+        async def send_with_headers(message: Message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = [*message.get('headers', ()), *SECURITY_HEADERS]
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_with_headers)
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
+class RequestLoggingMiddleware:
     """Log all requests for monitoring"""
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
         
-        # Log request
-        logger.info(f"Request: {request.method} {request.url.path}")
+        start_time = time.monotonic()
+        method = scope['method']
+        path = scope['path']
         
-        try:
-            response = await call_next(request)
-            process_time = time.time() - start_time
-            
-            # Log response
+        log_info = logger.isEnabledFor(logging.INFO)
+        
+        # Log request
+        if log_info:
             logger.info(
-                f"Response: {request.method} {request.url.path} "
-                f"Status: {response.status_code} Time: {process_time:.3f}s"
+                "Request: %s %s", method, path,
+                extra={'method': method, 'path': path}
             )
-            
-            # Add process time header
-            response.headers['X-Process-Time'] = str(process_time)
-            
-            return response
+        
+        async def send_with_timing(message: Message):
+            if message['type'] == 'http.response.start':
+                elapsed = time.monotonic() - start_time
+                # Formatted once for both the header and the log line
+                process_time = f"{elapsed:.3f}"
+                
+                # Log response
+                if log_info:
+                    logger.info(
+                        "Response: %s %s Status: %d Time: %ss",
+                        method, path, message['status'], process_time,
+                        extra={
+                            'method': method,
+                            'path': path,
+                            'status': message['status'],
+                            'time_ms': round(elapsed * 1000, 3),
+                        }
+                    )
+                
+                # Add process time header
+                message['headers'] = [*message.get('headers', ()), (b'x-process-time', process_time.encode())]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
         except Exception as e:
-            process_time = time.time() - start_time
+            elapsed = time.monotonic() - start_time
             logger.error(
-                f"Error: {request.method} {request.url.path} "
-                f"Error: {str(e)} Time: {process_time:.3f}s"
+                "Error: %s %s Error: %s Time: %.3fs",
+                method, path, e, elapsed,
+                extra={
+                    'method': method,
+                    'path': path,
+                    'error': str(e),
+                    'time_ms': round(elapsed * 1000, 3),
+                }
             )
             raise
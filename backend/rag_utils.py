@@ -4,19 +4,63 @@ Implements document chunking, FAISS indexing, Gemini embeddings, and retrieval w
 """
 
 import os
+import re
+import asyncio
+import bisect
+import functools
+import hashlib
 import logging
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
 import google.generativeai as genai
 import faiss
 from pathlib import Path
-import json
+import orjson
 import pickle
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from cachetools import LRUCache
 
 logger = logging.getLogger(__name__)
 
-# Initialize Gemini API
-genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
+# Initialize Gemini API; gRPC keeps one HTTP/2 channel open for all calls
+genai.configure(api_key=os.environ.get('GEMINI_API_KEY'), transport='grpc')
+
+# Embedding calls with the model and task type bound once
+_embed_documents = functools.partial(
+    genai.embed_content, model="models/embedding-001", task_type="retrieval_document"
+)
+_embed_query = functools.partial(
+    genai.embed_content, model="models/embedding-001", task_type="retrieval_query"
+)
+
+# Gemini models for re-ranking and answer generation, created once
+_rerank_model = genai.GenerativeModel('gemini-2.5-flash')
+_answer_model = genai.GenerativeModel('gemini-2.5-pro')
+
+# Characters chunk_text prefers to split after
+_BREAK_PATTERN = re.compile(r'[.\n]')
+
+# Maximum number of texts per batch embedding request
+EMBED_BATCH_SIZE = 100
+
+# Maximum number of embedding batch requests in flight at once
+EMBED_CONCURRENCY = 16
+
+# Texts shorter than this once stripped are not worth an embedding request
+MIN_EMBED_CHARS = 10
+
+# HNSW graph parameters: neighbours per node, and candidate list sizes
+# used while building the graph and while searching it
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Number of query() results kept for repeated questions; cleared whenever
+# documents are added, so answers never miss newly indexed documents
+QUERY_CACHE_SIZE = 1024
 
 class RAGPipeline:
     """RAG pipeline with FAISS vector store and Gemini embeddings"""
@@ -25,14 +69,69 @@ class RAGPipeline:
         self.index_dir = Path(index_dir)
         self.index_dir.mkdir(exist_ok=True)
         self.index = None
-        self.documents = []  # Store document chunks with metadata
+        # Document chunks as parallel lists; entry i belongs to index vector i
+        self._texts: List[str] = []
+        self._meta: List[Dict[str, Any]] = []
         self.dimension = 768  # Gemini embedding dimension
         self.index_file = self.index_dir / "faiss_index.bin"
-        self.docs_file = self.index_dir / "documents.pkl"
+        self.docs_file = self.index_dir / "documents.db"
+        self.legacy_docs_file = self.index_dir / "documents.pkl"
+        self._saved_documents = 0  # Leading documents already in docs_file
+        
+        # Keep the index on the first GPU when faiss was built with GPU support
+        self.gpu_resources = faiss.StandardGpuResources() if faiss.get_num_gpus() > 0 else None
+        self.index_on_gpu = False
+        # FAISS does not support searching an index while it is modified, so
+        # every use of self.index and every change to the document lists
+        # holds this lock
+        self._index_lock = threading.Lock()
+        self._query_cache = LRUCache(maxsize=QUERY_CACHE_SIZE)
+        self._query_cache_lock = threading.Lock()
+        # Bumped on every cache clear; an answer computed across a bump may
+        # predate the new documents and is not stored
+        self._query_cache_generation = 0
         
         # Load existing index if available
         self._load_index()
     
+    def _create_index(self) -> faiss.Index:
+        """
+        Create an empty index
+        
+        On CPU this is an HNSW graph over 8-bit scalar-quantized vectors,
+        which searches in sub-linear time and stores each vector in a quarter
+        of the float32 size. FAISS has no GPU HNSW, so on GPU a brute-force
+        flat index is used instead. Embeddings are L2-normalized, so inner
+        product is cosine similarity.
+        
+        The quantizer is trained up front on the fixed [-1, 1] range every
+        component of a unit vector lies in. Training on the first upload
+        instead would fix the ranges for good from as little as one chunk.
+        """
+        if self.gpu_resources is not None:
+            return self._to_gpu(faiss.IndexFlatIP(self.dimension))
+        
+        index = faiss.IndexHNSWSQ(
+            self.dimension, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        index.train(np.array([[-1.0] * self.dimension, [1.0] * self.dimension], dtype=np.float32))
+        return index
+    
+    def _to_gpu(self, index: faiss.Index) -> faiss.Index:
+        """Move a CPU index to the GPU, keeping it on CPU if unsupported"""
+        self.index_on_gpu = False
+        if self.gpu_resources is None:
+            return index
+        try:
+            gpu_index = faiss.index_cpu_to_gpu(self.gpu_resources, 0, index)
+            self.index_on_gpu = True
+            return gpu_index
+        except Exception as e:
+            logger.info(f"Keeping index on CPU: {e}")
+            return index
+    
     def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 100) -> List[str]:
         """
         Split text into overlapping chunks
@@ -45,30 +144,33 @@ class RAGPipeline:
         Returns:
             List of text chunks
         """
-        if not text or len(text) == 0:
+        if not text or text.isspace():
             return []
         
+        # Offsets of every sentence/line break, found in one regex pass
+        boundaries = [m.start() for m in _BREAK_PATTERN.finditer(text)]
+        text_len = len(text)
+        
         chunks = []
         start = 0
         
-        while start < len(text):
+        while start < text_len:
             end = start + chunk_size
-            chunk = text[start:end]
             
-            # Try to break at sentence boundary
-            if end < len(text):
-                last_period = chunk.rfind('.')
-                last_newline = chunk.rfind('\n')
-                break_point = max(last_period, last_newline)
-                
-                if break_point > chunk_size // 2:  # Only break if we're past halfway
-                    chunk = chunk[:break_point + 1]
-                    end = start + break_point + 1
+            # Try to break at the last sentence boundary inside the chunk
+            if end < text_len:
+                i = bisect.bisect_left(boundaries, end)
+                if i > 0:
+                    break_point = boundaries[i - 1] - start
+                    if break_point > chunk_size // 2:  # Only break if we're past halfway
+                        end = start + break_point + 1
             
-            chunks.append(chunk.strip())
+            chunk = text[start:end].strip()
+            if len(chunk) > 50:  # Filter very short chunks
+                chunks.append(chunk)
             start = end - overlap
         
-        return [c for c in chunks if len(c) > 50]  # Filter very short chunks
+        return chunks
     
     def generate_embedding(self, text: str) -> Optional[np.ndarray]:
         """
@@ -78,19 +180,39 @@ class RAGPipeline:
             text: Input text
             
         Returns:
-            Numpy array of embeddings or None on error
+            Numpy array of embeddings or None on error or near-empty text
         """
+        if len(text.strip()) < MIN_EMBED_CHARS:
+            return None
+        
         try:
-            result = genai.embed_content(
-                model="models/embedding-001",
-                content=text,
-                task_type="retrieval_document"
-            )
-            return np.array(result['embedding'], dtype=np.float32)
+            result = _embed_documents(content=text)
+            embedding = np.array(result['embedding'], dtype=np.float32)
+            faiss.normalize_L2(embedding.reshape(1, -1))
+            return embedding
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             return None
     
+    def generate_embeddings(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        Generate embeddings for a batch of texts in a single Gemini call
+        
+        Args:
+            texts: Input texts, at most EMBED_BATCH_SIZE
+            
+        Returns:
+            Array of shape (len(texts), dimension) or None on error
+        """
+        try:
+            result = _embed_documents(content=texts)
+            embeddings = np.array(result['embedding'], dtype=np.float32)
+            faiss.normalize_L2(embeddings)
+            return embeddings
+        except Exception as e:
+            logger.error(f"Error generating batch embeddings: {e}")
+            return None
+    
     def generate_query_embedding(self, query: str) -> Optional[np.ndarray]:
         """
         Generate embedding for query using Gemini
@@ -99,64 +221,125 @@ class RAGPipeline:
             query: Search query
             
         Returns:
-            Numpy array of embeddings or None on error
+            Numpy array of embeddings or None on error or blank query
         """
+        # Short queries such as "IPC 302" are legitimate, so only skip blank ones
+        if not query or query.isspace():
+            return None
+        
         try:
-            result = genai.embed_content(
-                model="models/embedding-001",
-                content=query,
-                task_type="retrieval_query"
-            )
-            return np.array(result['embedding'], dtype=np.float32)
+            result = _embed_query(content=query)
+            embedding = np.array(result['embedding'], dtype=np.float32)
+            faiss.normalize_L2(embedding.reshape(1, -1))
+            return embedding
         except Exception as e:
             logger.error(f"Error generating query embedding: {e}")
             return None
     
+    def _embeddable(self, texts: List[str], metadata: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Drop near-empty chunks, and their metadata, before spending embedding requests on them"""
+        kept = [i for i, text in enumerate(texts) if len(text.strip()) >= MIN_EMBED_CHARS]
+        if len(kept) < len(texts):
+            texts = [texts[i] for i in kept]
+            metadata = [metadata[i] for i in kept]
+        return texts, metadata
+    
     def add_documents(self, texts: List[str], metadata: List[Dict[str, Any]]):
         """
         Add documents to the FAISS index
         
+        Embedding batches are requested concurrently from a thread pool.
+        Prefer add_documents_async from async code.
+        
+        Args:
+            texts: List of text chunks
+            metadata: List of metadata dicts for each chunk
+        """
+        texts, metadata = self._embeddable(texts, metadata)
+        if not texts:
+            return
+        
+        batches = [texts[start:start + EMBED_BATCH_SIZE] for start in range(0, len(texts), EMBED_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=min(EMBED_CONCURRENCY, len(batches))) as executor:
+            batch_embeddings = list(executor.map(self.generate_embeddings, batches))
+        
+        self._add_embedded(texts, metadata, batch_embeddings)
+    
+    async def add_documents_async(self, texts: List[str], metadata: List[Dict[str, Any]]):
+        """
+        Add documents to the FAISS index without blocking the event loop
+        
+        Up to EMBED_CONCURRENCY embedding batches are in flight at once.
+        
         Args:
             texts: List of text chunks
             metadata: List of metadata dicts for each chunk
         """
+        texts, metadata = self._embeddable(texts, metadata)
         if not texts:
             return
         
-        # Initialize index if needed
-        if self.index is None:
-            self.index = faiss.IndexFlatL2(self.dimension)
+        semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
         
-        # Generate embeddings
-        embeddings = []
+        async def embed(batch: List[str]) -> Optional[np.ndarray]:
+            async with semaphore:
+                return await asyncio.to_thread(self.generate_embeddings, batch)
+        
+        batch_embeddings = await asyncio.gather(*(
+            embed(texts[start:start + EMBED_BATCH_SIZE])
+            for start in range(0, len(texts), EMBED_BATCH_SIZE)
+        ))
+        
+        # Index insertion and the disk write are blocking too
+        await asyncio.to_thread(self._add_embedded, texts, metadata, batch_embeddings)
+    
+    def _add_embedded(self, texts: List[str], metadata: List[Dict[str, Any]], batch_embeddings: List[Optional[np.ndarray]]):
+        """
+        Add embedded chunks to the index and save it
+        
+        Args:
+            texts: List of text chunks
+            metadata: List of metadata dicts for each chunk
+            batch_embeddings: Embeddings per EMBED_BATCH_SIZE slice of texts, None for failed batches
+        """
+        # Write the successful batches straight into a preallocated array
+        embeddings_array = np.empty((len(texts), self.dimension), dtype=np.float32)
+        rows = 0
         valid_texts = []
         valid_metadata = []
         
-        for i, text in enumerate(texts):
-            embedding = self.generate_embedding(text)
-            if embedding is not None:
-                embeddings.append(embedding)
-                valid_texts.append(text)
-                valid_metadata.append(metadata[i])
+        for start, batch_embedding in zip(range(0, len(texts), EMBED_BATCH_SIZE), batch_embeddings):
+            if batch_embedding is not None:
+                batch_size = len(batch_embedding)
+                embeddings_array[rows:rows + batch_size] = batch_embedding
+                rows += batch_size
+                valid_texts.extend(texts[start:start + batch_size])
+                valid_metadata.extend(metadata[start:start + batch_size])
         
-        if not embeddings:
+        if rows == 0:
             logger.warning("No valid embeddings generated")
             return
         
-        # Add to FAISS index
-        embeddings_array = np.array(embeddings, dtype=np.float32)
-        self.index.add(embeddings_array)
-        
-        # Store documents with metadata
-        for text, meta in zip(valid_texts, valid_metadata):
-            self.documents.append({
-                "text": text,
-                "metadata": meta
-            })
+        embeddings_array = embeddings_array[:rows]
         
-        # Save index
-        self._save_index()
-        logger.info(f"Added {len(embeddings)} documents to index. Total: {len(self.documents)}")
+        # Concurrent uploads must not interleave index and document list
+        # updates, and searches must not see a half-added batch
+        with self._index_lock:
+            # Initialize index if needed
+            if self.index is None:
+                self.index = self._create_index()
+            
+            # Add to FAISS index in a single call
+            self.index.add(embeddings_array)
+            
+            # Store documents with metadata
+            self._texts.extend(valid_texts)
+            self._meta.extend(valid_metadata)
+            self.clear_query_cache()
+            
+            # Save index
+            self._save_index()
+            logger.info(f"Added {rows} documents to index. Total: {len(self._texts)}")
     
     def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
         """
@@ -169,7 +352,7 @@ class RAGPipeline:
         Returns:
             List of relevant documents with scores
         """
-        if self.index is None or len(self.documents) == 0:
+        if self.index is None or len(self._texts) == 0:
             logger.warning("Index is empty")
             return []
         
@@ -180,16 +363,33 @@ class RAGPipeline:
         
         # Search FAISS index
         query_embedding = query_embedding.reshape(1, -1)
-        distances, indices = self.index.search(query_embedding, min(k, len(self.documents)))
+        with self._index_lock:
+            if self.index is None or len(self._texts) == 0:
+                return []
+            distances, indices = self.index.search(query_embedding, min(k, len(self._texts)))
+            inner_product = self.index.metric_type == faiss.METRIC_INNER_PRODUCT
+            # The lists are only appended to or replaced, so these references
+            # stay valid for the returned indices once the lock is released
+            texts, meta = self._texts, self._meta
         
-        # Retrieve documents
+        # Inner-product indexes already return cosine similarity; older L2
+        # indexes on disk still need the distance converted to a score
+        dists = distances[0]
+        if inner_product:
+            scores = dists.tolist()
+        else:
+            scores = (1.0 / (1.0 + dists)).tolist()
+        
+        # Retrieve documents (FAISS pads missing results with -1)
         results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            if idx < len(self.documents):
-                doc = self.documents[idx].copy()
-                doc['score'] = float(1 / (1 + dist))  # Convert distance to similarity score
-                doc['distance'] = float(dist)
-                results.append(doc)
+        for dist, score, idx in zip(dists.tolist(), scores, indices[0].tolist()):
+            if 0 <= idx < len(texts):
+                results.append({
+                    "text": texts[idx],
+                    "metadata": meta[idx],
+                    "score": score,
+                    "distance": dist
+                })
         
         return results
     
@@ -210,31 +410,16 @@ class RAGPipeline:
         
         try:
             # Use Gemini to score relevance
-            model = genai.GenerativeModel('gemini-2.5-flash')
+            model = _rerank_model
             
-            scored_results = []
-            for result in results:
-                prompt = f"""On a scale of 0-10, rate how relevant this text is to the query.
-Only respond with a number.
-
-Query: {query}
-
-Text: {result['text'][:500]}
-
-Relevance score (0-10):"""
-                
-                try:
-                    response = model.generate_content(prompt)
-                    score_text = response.text.strip()
-                    # Extract number from response
-                    score = float(''.join(c for c in score_text if c.isdigit() or c == '.'))
-                    score = min(max(score, 0), 10)  # Clamp between 0-10
-                    result['rerank_score'] = score
-                    scored_results.append(result)
-                except:
-                    # If re-ranking fails, keep original score
-                    result['rerank_score'] = result['score'] * 10
-                    scored_results.append(result)
+            try:
+                scores = self._score_relevance_batch(model, query, results)
+                for result, score in zip(results, scores):
+                    result['rerank_score'] = min(max(score, 0), 10)  # Clamp between 0-10
+                scored_results = list(results)
+            except Exception as e:
+                logger.warning(f"Batch re-ranking failed, scoring individually: {e}")
+                scored_results = self._score_relevance_individually(model, query, results)
             
             # Sort by rerank score
             scored_results.sort(key=lambda x: x['rerank_score'], reverse=True)
@@ -245,6 +430,65 @@ Relevance score (0-10):"""
             # Fallback to original ranking
             return results[:top_k]
     
+    def _score_relevance_batch(self, model, query: str, results: List[Dict[str, Any]]) -> List[float]:
+        """
+        Score every result against the query in a single Gemini call
+        
+        Returns:
+            One 0-10 relevance score per result, in order
+        
+        Raises:
+            ValueError: If the response is not a JSON array of len(results) numbers
+        """
+        texts = "\n\n".join(
+            f"[{i + 1}] {result['text'][:500]}"
+            for i, result in enumerate(results)
+        )
+        prompt = f"""On a scale of 0-10, rate how relevant each of the following {len(results)} texts is to the query.
+Only respond with a JSON array of {len(results)} numbers, one per text, in the order given.
+
+Query: {query}
+
+Texts:
+{texts}
+
+Relevance scores (JSON array):"""
+        
+        response = model.generate_content(prompt)
+        score_text = response.text
+        # Tolerate markdown code fences or prose around the array
+        scores = orjson.loads(score_text[score_text.index('['):score_text.rindex(']') + 1])
+        if not isinstance(scores, list) or len(scores) != len(results):
+            raise ValueError(f"Expected {len(results)} scores, got: {score_text[:100]}")
+        return [float(score) for score in scores]
+    
+    def _score_relevance_individually(self, model, query: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Score each result with its own Gemini call"""
+        scored_results = []
+        for result in results:
+            prompt = f"""On a scale of 0-10, rate how relevant this text is to the query.
+Only respond with a number.
+
+Query: {query}
+
+Text: {result['text'][:500]}
+
+Relevance score (0-10):"""
+            
+            try:
+                response = model.generate_content(prompt)
+                score_text = response.text.strip()
+                # Extract number from response
+                score = float(''.join(c for c in score_text if c.isdigit() or c == '.'))
+                score = min(max(score, 0), 10)  # Clamp between 0-10
+                result['rerank_score'] = score
+                scored_results.append(result)
+            except:
+                # If re-ranking fails, keep original score
+                result['rerank_score'] = result['score'] * 10
+                scored_results.append(result)
+        return scored_results
+    
     def query(self, query: str, top_k: int = 3, use_rerank: bool = True) -> Tuple[List[Dict[str, Any]], str]:
         """
         Query the RAG pipeline and generate grounded response
@@ -257,6 +501,15 @@ Relevance score (0-10):"""
         Returns:
             Tuple of (retrieved documents, generated response)
         """
+        # Repeated questions differing only in case or spacing share an entry
+        normalized = " ".join(query.lower().split())
+        cache_key = (hashlib.blake2b(normalized.encode(), digest_size=16).digest(), top_k, use_rerank)
+        with self._query_cache_lock:
+            cached = self._query_cache.get(cache_key)
+            generation = self._query_cache_generation
+        if cached is not None:
+            return cached
+        
         # Search for relevant documents
         results = self.search(query, k=top_k * 2)
         
@@ -276,7 +529,7 @@ Relevance score (0-10):"""
         ])
         
         try:
-            model = genai.GenerativeModel('gemini-2.5-pro')
+            model = _answer_model
             prompt = f"""You are Pleader AI, an expert legal assistant specializing EXCLUSIVELY in Indian law.
 
 Context from documents:
@@ -299,58 +552,121 @@ Answer (with citations):"""
             response = model.generate_content(prompt)
             answer = response.text
             
+            # Only successful answers are cached, so errors are retried, and
+            # only if no documents were added or cleared since the lookup
+            with self._query_cache_lock:
+                if self._query_cache_generation == generation:
+                    self._query_cache[cache_key] = (results, answer)
             return results, answer
             
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             return results, f"I found relevant information but encountered an error generating the response: {str(e)}"
     
+    def clear_query_cache(self):
+        """Forget cached query() results"""
+        with self._query_cache_lock:
+            self._query_cache.clear()
+            self._query_cache_generation += 1
+    
+    def _connect_docs(self) -> sqlite3.Connection:
+        """Open the documents database, creating the table if needed"""
+        conn = sqlite3.connect(self.docs_file)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        return conn
+    
+    def _save_documents(self):
+        """Append documents not yet on disk; row id N holds index vector N-1"""
+        start = self._saved_documents
+        with closing(self._connect_docs()) as conn, conn:
+            if start == 0:
+                # Nothing known to be on disk yet, so replace whatever is there
+                conn.execute("DELETE FROM docs")
+            conn.executemany(
+                "INSERT INTO docs (text, metadata) VALUES (?, ?)",
+                zip(self._texts[start:], (orjson.dumps(meta, default=str).decode() for meta in self._meta[start:]))
+            )
+        self._saved_documents = len(self._texts)
+    
+    def _load_documents(self):
+        """Read all documents from the documents database, in index order"""
+        with closing(self._connect_docs()) as conn:
+            rows = conn.execute("SELECT text, metadata FROM docs ORDER BY id").fetchall()
+        self._texts = [text for text, _ in rows]
+        self._meta = [orjson.loads(meta) for _, meta in rows]
+    
+    def _migrate_legacy_documents(self):
+        """One-time conversion of a documents.pkl store to the documents database"""
+        with open(self.legacy_docs_file, 'rb') as f:
+            documents = pickle.load(f)
+        self._texts = [doc["text"] for doc in documents]
+        self._meta = [doc["metadata"] for doc in documents]
+        self._saved_documents = 0
+        self._save_documents()
+        self.legacy_docs_file.unlink()
+        logger.info(f"Migrated {len(self._texts)} documents from {self.legacy_docs_file.name}")
+    
     def _save_index(self):
         """Save FAISS index and documents to disk"""
         try:
             if self.index is not None:
-                faiss.write_index(self.index, str(self.index_file))
+                index = faiss.index_gpu_to_cpu(self.index) if self.index_on_gpu else self.index
+                faiss.write_index(index, str(self.index_file))
             
-            with open(self.docs_file, 'wb') as f:
-                pickle.dump(self.documents, f)
+            self._save_documents()
             
-            logger.info(f"Index saved with {len(self.documents)} documents")
+            logger.info(f"Index saved with {len(self._texts)} documents")
         except Exception as e:
             logger.error(f"Error saving index: {e}")
     
     def _load_index(self):
         """Load FAISS index and documents from disk"""
         try:
+            if not self.docs_file.exists() and self.legacy_docs_file.exists():
+                self._migrate_legacy_documents()
+            
             if self.index_file.exists() and self.docs_file.exists():
-                self.index = faiss.read_index(str(self.index_file))
+                self.index = self._to_gpu(faiss.read_index(str(self.index_file)))
                 
-                with open(self.docs_file, 'rb') as f:
-                    self.documents = pickle.load(f)
+                self._load_documents()
+                self._saved_documents = len(self._texts)
                 
-                logger.info(f"Loaded index with {len(self.documents)} documents")
+                logger.info(f"Loaded index with {len(self._texts)} documents")
         except Exception as e:
             logger.warning(f"Could not load existing index: {e}")
             self.index = None
-            self.documents = []
+            self._texts = []
+            self._meta = []
+            self._saved_documents = 0
     
     def clear_index(self):
         """Clear the entire index"""
-        self.index = None
-        self.documents = []
-        
-        if self.index_file.exists():
-            self.index_file.unlink()
-        if self.docs_file.exists():
-            self.docs_file.unlink()
+        with self._index_lock:
+            self.index = None
+            self.index_on_gpu = False
+            self._texts = []
+            self._meta = []
+            self._saved_documents = 0
+            self.clear_query_cache()
+            
+            if self.index_file.exists():
+                self.index_file.unlink()
+            if self.docs_file.exists():
+                self.docs_file.unlink()
+            if self.legacy_docs_file.exists():
+                self.legacy_docs_file.unlink()
         
         logger.info("Index cleared")
     
     def get_stats(self) -> Dict[str, Any]:
         """Get index statistics"""
         return {
-            "total_documents": len(self.documents),
+            "total_documents": len(self._texts),
             "index_initialized": self.index is not None,
-            "index_size": self.index.ntotal if self.index else 0
+            "index_size": self.index.ntotal if self.index else 0,
+            "gpu": self.index_on_gpu
         }
 
 
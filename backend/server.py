@@ -1,31 +1,38 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, UploadFile, File, Form, BackgroundTasks
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
+import time
+import asyncio
 import logging
+import threading
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
 import bcrypt
 import google.generativeai as genai
-import json
+import orjson
 import base64
+import hashlib
+import hmac
 import io
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import LRUCache, TTLCache
 
 # Import our utility modules
 from rag_utils import get_rag_pipeline
-from document_utils import extract_text_from_file, validate_file_type
+from document_utils import extract_text_from_file, validate_file_type, shutdown_pdf_executor
 from export_utils import (
-    export_chat_to_pdf, export_chat_to_docx, export_chat_to_txt,
+    export_chat_to_pdf, export_chat_to_docx, export_chat_to_txt, stream_chat_to_txt,
     export_analysis_to_pdf, export_analysis_to_docx, export_analysis_to_txt
 )
 # [NEW] Import Supabase client
-from database import get_supabase
+from database import get_supabase, connect as connect_database, ping as ping_database, close as close_database
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -35,15 +42,49 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize Gemini API
-genai.configure(api_key=os.environ['GEMINI_API_KEY'])
+genai.configure(api_key=os.environ['GEMINI_API_KEY'], transport='grpc')
+
+# Gemini model shared by the chat and document analysis endpoints
+GEMINI_FLASH = genai.GenerativeModel('gemini-2.5-flash')
 
 # JWT configuration
 JWT_SECRET = os.environ['JWT_SECRET']
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION = timedelta(days=7)
 
-# Create the main app
-app = FastAPI()
+# bcrypt work factor for new password hashes; existing hashes keep the cost
+# they were created with. Each step doubles hashing time.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 10))
+
+# Tag on stored hashes of SHA-256 pre-hashed passwords; untagged hashes are
+# plain bcrypt from before pre-hashing and still verify
+PASSWORD_PREHASH_PREFIX = "bcrypt-sha256$"
+
+# Dedicated threads for bcrypt, one per core. bcrypt releases the GIL, so
+# hashes run in parallel, and a burst of logins cannot take over the
+# default pool used by asyncio.to_thread elsewhere.
+_password_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="bcrypt")
+
+# Verified tokens: token digest -> (user_id, exp timestamp), so repeat
+# requests in a session skip signature verification. Keyed by a digest so
+# the cache holds fixed-size keys rather than live bearer tokens.
+TOKEN_CACHE_SIZE = 4096
+_token_cache = LRUCache(maxsize=TOKEN_CACHE_SIZE)
+_token_cache_lock = threading.Lock()
+
+# User ids recently confirmed to exist, so authenticated requests skip the
+# users lookup; a deleted user keeps access for at most KNOWN_USER_TTL seconds
+KNOWN_USER_TTL = 60
+_known_users = TTLCache(maxsize=10000, ttl=KNOWN_USER_TTL)
+_known_users_lock = threading.Lock()
+
+def remember_user(user_id: str):
+    """Mark a user id as known to exist"""
+    with _known_users_lock:
+        _known_users[user_id] = True
+
+# Create the main app; responses are serialized with orjson
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -51,6 +92,25 @@ api_router = APIRouter(prefix="/api")
 # Security
 security = HTTPBearer(auto_error=False)
 
+def _uuid7() -> uuid.UUID:
+    """Time-ordered UUID (RFC 9562 version 7): 48-bit Unix milliseconds, then random bits"""
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    value = value & ~(0xF << 76) | (0x7 << 76)  # Version 7
+    value = value & ~(0x3 << 62) | (0x2 << 62)  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
+# Python 3.14+ ships uuid.uuid7
+uuid7 = getattr(uuid, 'uuid7', _uuid7)
+
+def new_id() -> str:
+    """
+    Generate a primary key for a new row
+    
+    Version 7 UUIDs start with a timestamp, so new rows land at the end of
+    the primary key index instead of at random pages as with uuid4.
+    """
+    return str(uuid7())
+
 # ==================== MODELS ====================
 
 class UserCreate(BaseModel):
@@ -63,7 +123,7 @@ class UserLogin(BaseModel):
     password: str
 
 class User(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     name: str
     email: EmailStr
     avatar_url: Optional[str] = None
@@ -96,26 +156,55 @@ def create_token(user_id: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def _token_key(token: str) -> bytes:
+    """Token cache key"""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
 def verify_token(token: str) -> Optional[str]:
     """Verify JWT token and return user_id"""
+    key = _token_key(token)
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    if cached is not None:
+        user_id, exp = cached
+        if exp > time.time():
+            return user_id
+        with _token_cache_lock:
+            _token_cache.pop(key, None)
+        return None
+    
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload.get("user_id")
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
-
-def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """Get current user from token (cookie or header)"""
-    token = None
     
-    # Try to get from cookie first
+    user_id = payload.get("user_id")
+    if user_id and "exp" in payload:
+        with _token_cache_lock:
+            _token_cache[key] = (user_id, payload["exp"])
+    return user_id
+
+def forget_token(token: str):
+    """Drop a token from the verification cache"""
+    with _token_cache_lock:
+        _token_cache.pop(_token_key(token), None)
+
+def get_request_token(request: Request, credentials: Optional[HTTPAuthorizationCredentials]) -> Optional[str]:
+    """Get the session token from the cookie, falling back to the Authorization header"""
     token = request.cookies.get("session_token")
-    
-    # Fallback to Authorization header
     if not token and credentials:
         token = credentials.credentials
+    return token
+
+def is_test_user(user_id: str) -> bool:
+    """Check whether a user id belongs to a development test account (see login)"""
+    return user_id.startswith("test-user-")
+
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """Get current user from token (cookie or header)"""
+    token = get_request_token(request, credentials)
     
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
@@ -125,41 +214,98 @@ def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     
     # Check if it's a test user
-    if user_id.startswith("test-user-"):
+    if is_test_user(user_id):
         return user_id  # Return test user ID directly
     
+    with _known_users_lock:
+        if user_id in _known_users:
+            return user_id
+    
     # Verify regular user exists in database
     # [SUPABASE]
     try:
         supabase = get_supabase()
-        response = supabase.table('users').select("id").eq("id", user_id).execute()
-        if not response.data:
-            raise HTTPException(status_code=401, detail="User not found")
+        response = await supabase.table('users').select("id").eq("id", user_id).execute()
     except Exception as e:
         logger.error(f"Auth error: {str(e)}")
         raise HTTPException(status_code=500, detail="Database connection error")
-        
+    
+    if not response.data:
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    remember_user(user_id)
     return user_id
 
+def _prehash_password(password: str) -> bytes:
+    """
+    SHA-256 digest of a password, base64 encoded for bcrypt
+    
+    bcrypt only reads 72 bytes and rejects NUL bytes; the encoded digest is
+    44 bytes, so every password character counts regardless of length.
+    """
+    return base64.b64encode(hashlib.sha256(password.encode('utf-8')).digest())
+
+def hash_password(password: str) -> str:
+    """Hash a password for storage"""
+    hashed = bcrypt.hashpw(_prehash_password(password), bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+    return PASSWORD_PREHASH_PREFIX + hashed.decode('utf-8')
+
+def check_password(password: str, stored_password: str) -> bool:
+    """Check a password against a stored hash, pre-hashed or legacy"""
+    if not stored_password:
+        return False
+    if stored_password.startswith(PASSWORD_PREHASH_PREFIX):
+        hashed = stored_password[len(PASSWORD_PREHASH_PREFIX):].encode('utf-8')
+        return bcrypt.checkpw(_prehash_password(password), hashed)
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), stored_password.encode('utf-8'))
+    except ValueError:
+        # Passwords over 72 bytes cannot match a legacy hash
+        return False
+
+async def run_password_hashing(func, *args):
+    """Run a password hashing function on the bcrypt threads"""
+    return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
+
+# ==================== CONDITIONAL REQUESTS ====================
+
+def make_etag(*parts: Any) -> str:
+    """Build a weak ETag from the values that determine a response"""
+    digest = hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Attach an ETag to the response, or build a 304 if the client already has it
+    
+    Returns:
+        An empty 304 response when If-None-Match matches etag, else None
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
 # ==================== AUTHENTICATION ENDPOINTS ====================
 
 @api_router.post("/auth/signup")
-def signup(user_data: UserCreate):
+async def signup(user_data: UserCreate):
     """Register a new user"""
     supabase = get_supabase()
     
     # Check if user already exists
-    res = supabase.table('users').select("*").eq("email", user_data.email).execute()
+    res = await supabase.table('users').select("id").eq("email", user_data.email).execute()
     if res.data:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Hash password
-    password_bytes = user_data.password.encode('utf-8')
-    hashed_password = bcrypt.hashpw(password_bytes, bcrypt.gensalt()).decode('utf-8')
+    # Hash password; bcrypt is deliberately slow, so keep it off the event loop
+    hashed_password = await run_password_hashing(hash_password, user_data.password)
     
     # Create user
     new_user = {
-        "id": str(uuid.uuid4()),
+        "id": new_id(),
         "name": user_data.name,
         "email": user_data.email,
         "password": hashed_password,
@@ -171,7 +317,8 @@ def signup(user_data: UserCreate):
         }
     }
     
-    supabase.table('users').insert(new_user).execute()
+    await supabase.table('users').insert(new_user).execute()
+    remember_user(new_user['id'])
     
     # Create token
     token = create_token(new_user['id'])
@@ -186,7 +333,7 @@ def signup(user_data: UserCreate):
     }
 
 @api_router.post("/auth/login")
-def login(credentials: UserLogin):
+async def login(credentials: UserLogin):
     """Login user"""
     # Test accounts for development
     TEST_ACCOUNTS = {
@@ -196,7 +343,8 @@ def login(credentials: UserLogin):
     
     if credentials.email in TEST_ACCOUNTS:
         test_user = TEST_ACCOUNTS[credentials.email]
-        if credentials.password == test_user["password"]:
+        # Constant-time comparison, so response timing does not leak the password
+        if hmac.compare_digest(credentials.password.encode('utf-8'), test_user["password"].encode('utf-8')):
             token = create_token(test_user["id"])
             return {
                 "token": token,
@@ -207,7 +355,7 @@ def login(credentials: UserLogin):
     
     # Regular database authentication
     supabase = get_supabase()
-    res = supabase.table('users').select("*").eq("email", credentials.email).execute()
+    res = await supabase.table('users').select("id, name, email, avatar_url, password").eq("email", credentials.email).execute()
     
     if not res.data:
         raise HTTPException(status_code=401, detail="Invalid email or password")
@@ -215,11 +363,11 @@ def login(credentials: UserLogin):
     user = res.data[0]
     
     # Verify password
-    password_bytes = credentials.password.encode('utf-8')
-    stored_password = user.get("password", "").encode('utf-8')
-    if not bcrypt.checkpw(password_bytes, stored_password):
+    if not await run_password_hashing(check_password, credentials.password, user.get("password") or ""):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
+    remember_user(user["id"])
+    
     # Create token
     token = create_token(user["id"])
     
@@ -234,101 +382,57 @@ def login(credentials: UserLogin):
     }
 
 @api_router.post("/auth/logout")
-def logout(response: Response, user_id: str = Depends(get_current_user)):
+async def logout(
+    request: Request,
+    response: Response,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user_id: str = Depends(get_current_user)
+):
     """Logout user"""
+    forget_token(get_request_token(request, credentials))
     response.delete_cookie(key="session_token")
     return {"message": "Logged out successfully"}
 
 @api_router.get("/auth/me")
-def get_me(user_id: str = Depends(get_current_user)):
+async def get_me(request: Request, response: Response, user_id: str = Depends(get_current_user)):
     """Get current user info"""
-    if user_id.startswith("test-user-"):
+    if is_test_user(user_id):
         return {"id": user_id, "name": "Test User", "email": f"{user_id}@test.com"}
         
     supabase = get_supabase()
-    res = supabase.table('users').select("*").eq("id", user_id).execute()
+    res = await supabase.table('users').select("id, name, email, avatar_url, preferences").eq("id", user_id).execute()
     
     if not res.data:
         raise HTTPException(status_code=404, detail="User not found")
         
     user = res.data[0]
-    return {
+    body = {
         "id": user["id"],
         "name": user["name"],
         "email": user["email"],
         "avatar_url": user.get("avatar_url"),
         "preferences": user.get("preferences", {})
     }
+    
+    # The profile row has no modification time, so the ETag covers the body
+    etag = make_etag(orjson.dumps(body, option=orjson.OPT_SORT_KEYS))
+    return not_modified(request, response, etag) or body
 
 # ==================== CHAT ENDPOINTS ====================
 
-@api_router.post("/chat/send")
-def send_message(request: SendMessageRequest, user_id: str = Depends(get_current_user)):
-    """Send a message and get AI response"""
-    try:
-        supabase = get_supabase()
-        chat_id = request.chat_id
-        is_new_chat = False
-        chat = None
-        
-        # Get or create chat
-        if chat_id:
-            res = supabase.table('chats').select("*").eq("id", chat_id).eq("user_id", user_id).execute()
-            if not res.data:
-                raise HTTPException(status_code=404, detail="Chat not found")
-            chat = res.data[0]
-        else:
-            is_new_chat = True
-            chat_id = str(uuid.uuid4())
-            chat = {
-                "id": chat_id,
-                "user_id": user_id,
-                "title": request.message[:50] + "..." if len(request.message) > 50 else request.message,
-                "messages": [],
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-            supabase.table('chats').insert(chat).execute()
-            # Reload to ensure we have correct format
-            chat['messages'] = []
-        
-        # Current messages
-        messages_list = chat.get('messages') or []
-        if isinstance(messages_list, str):
-            try:
-                messages_list = json.loads(messages_list)
-            except:
-                messages_list = []
-        
-        # [RAG INTEGRATION] Retrieve relevant context from uploaded documents
-        context_text = ""
-        try:
-            rag = get_rag_pipeline()
-            rag_results = rag.search(request.message, k=3)
-            if rag_results:
-                context_text = "\n\nRELEVANT DOCUMENT CONTEXT:\n" + "\n".join([
-                    f"- From {doc['metadata'].get('filename', 'Unknown')}:\n{doc['text'][:500]}..." 
-                    for doc in rag_results
-                ])
-        except Exception as e:
-            logger.warning(f"RAG search failed in chat: {e}")
-
-        # Generate AI response using Gemini
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Build conversation history
-        conversation_history = "\n".join([
-            f"{msg.get('sender', 'user')}: {msg.get('content', '')}"
-            for msg in messages_list[-5:]
-        ])
-        
-        prompt = f"""You are Pleader AI, an expert legal assistant specializing EXCLUSIVELY in Indian law.
-Previous conversation:
-{conversation_history}
+# Number of previous messages included in the chat prompt
+CHAT_HISTORY_MESSAGES = 5
 
-{context_text}
+# Test accounts have no users row to attach chats to, so their chats are
+# kept in memory per process instead of in Supabase
+TEST_CHATS_SIZE = 1000
+_test_chats = LRUCache(maxsize=TEST_CHATS_SIZE)
 
-User question: {request.message}
+# Static parts of the chat prompt; history, context and the question go between
+CHAT_PROMPT_PREFIX = """You are Pleader AI, an expert legal assistant specializing EXCLUSIVELY in Indian law.
+Previous conversation:
+"""
+CHAT_PROMPT_SUFFIX = """
 STRICT INSTRUCTIONS:
 - Focus ONLY on Indian legal system and laws
 - Use the provided DOCUMENT CONTEXT to answer if relevant
@@ -337,22 +441,131 @@ STRICT INSTRUCTIONS:
 - Be professional and accurate
 - AT THE END, provide a "References & Further Reading" section with 2-3 specific Google Search links or plain text citations for the user to study.
 Answer:"""
+
+async def _load_chat_history(request: SendMessageRequest, user_id: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Get or create the chat a message is sent to
+    
+    Returns:
+        Tuple of (chat_id, recent messages)
+    """
+    chat_id = request.chat_id
+    test_user = is_test_user(user_id)
+    
+    # Get or create chat
+    if chat_id and test_user:
+        chat = _test_chats.get(chat_id)
+        if chat is None or chat["user_id"] != user_id:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        return chat_id, chat["messages"][-CHAT_HISTORY_MESSAGES:]
+    elif chat_id:
+        # Only the messages used as conversation history are fetched
+        res = await get_supabase().rpc('recent_chat_messages', {
+            "p_chat_id": chat_id, "p_user_id": user_id, "p_limit": CHAT_HISTORY_MESSAGES
+        }).execute()
+        if res.data is None:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        # The function returns jsonb, which postgrest-py already decodes
+        return chat_id, res.data
+    else:
+        chat_id = new_id()
+        now = datetime.now(timezone.utc).isoformat()
+        chat = {
+            "id": chat_id,
+            "user_id": user_id,
+            "title": request.message[:50] + "..." if len(request.message) > 50 else request.message,
+            "created_at": now,
+            "updated_at": now
+        }
+        if test_user:
+            _test_chats[chat_id] = {**chat, "messages": []}
+        else:
+            await get_supabase().table('chats').insert(chat).execute()
+        return chat_id, []
+
+async def _document_context(message: str) -> str:
+    """Retrieve relevant context from uploaded documents; empty if none or on failure"""
+    try:
+        rag = get_rag_pipeline()
+        # Embedding and FAISS search are blocking; run them in a worker thread
+        rag_results = await asyncio.to_thread(rag.search, message, k=3)
+        if rag_results:
+            return "\n\nRELEVANT DOCUMENT CONTEXT:\n" + "\n".join([
+                f"- From {doc['metadata'].get('filename', 'Unknown')}:\n{doc['text'][:500]}..." 
+                for doc in rag_results
+            ])
+    except Exception as e:
+        logger.warning(f"RAG search failed in chat: {e}")
+    return ""
+
+async def _prepare_chat(request: SendMessageRequest, user_id: str) -> Tuple[str, str]:
+    """
+    Get or create the chat and build the Gemini prompt for a new message
+    
+    Returns:
+        Tuple of (chat_id, prompt)
+    """
+    # [RAG INTEGRATION] Document retrieval does not depend on the chat, so it
+    # runs alongside the history query instead of after it
+    (chat_id, messages_list), context_text = await asyncio.gather(
+        _load_chat_history(request, user_id),
+        _document_context(request.message)
+    )
+    
+    # Build conversation history
+    conversation_history = "\n".join([
+        f"{msg.get('sender', 'user')}: {msg.get('content', '')}"
+        for msg in messages_list[-CHAT_HISTORY_MESSAGES:]
+    ])
+    
+    # One join allocates the prompt once instead of a string per "+"
+    prompt = "".join((
+        CHAT_PROMPT_PREFIX, conversation_history, "\n\n", context_text,
+        "\n\nUser question: ", request.message, CHAT_PROMPT_SUFFIX
+    ))
+    
+    return chat_id, prompt
+
+async def _save_chat_turn(chat_id: str, user_id: str, user_text: str, ai_text: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Append a user message and the AI reply to a chat
+    
+    Returns:
+        Tuple of (user_message, ai_message)
+    """
+    # One timestamp for the turn; both messages are stored together
+    now = datetime.now(timezone.utc).isoformat()
+    user_message = {"sender": "user", "content": user_text, "timestamp": now}
+    ai_message = {"sender": "ai", "content": ai_text, "timestamp": now}
+    
+    if is_test_user(user_id):
+        chat = _test_chats.get(chat_id)
+        if chat is not None:
+            chat["messages"].extend((user_message, ai_message))
+            chat["updated_at"] = now
+        return user_message, ai_message
+    
+    # Two new chat_messages rows, whatever the length of the chat
+    await get_supabase().rpc('append_chat_messages', {
+        "p_chat_id": chat_id, "p_user_id": user_id, "p_messages": [user_message, ai_message]
+    }).execute()
+    
+    return user_message, ai_message
+
+def _sse_event(payload: Dict[str, Any]) -> bytes:
+    """Encode a payload as a server-sent event frame"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+@api_router.post("/chat/send")
+async def send_message(request: SendMessageRequest, user_id: str = Depends(get_current_user)):
+    """Send a message and get AI response"""
+    try:
+        chat_id, prompt = await _prepare_chat(request, user_id)
         
-        response = model.generate_content(prompt)
-        ai_response_text = response.text
-        
-        # Add messages
-        user_message = {"sender": "user", "content": request.message, "timestamp": datetime.now(timezone.utc).isoformat()}
-        ai_message = {"sender": "ai", "content": ai_response_text, "timestamp": datetime.now(timezone.utc).isoformat()}
-        
-        messages_list.append(user_message)
-        messages_list.append(ai_message)
+        # Generate AI response using Gemini
+        response = await GEMINI_FLASH.generate_content_async(prompt)
         
-        # Update chat
-        supabase.table('chats').update({
-            "messages": messages_list,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }).eq("id", chat_id).execute()
+        user_message, ai_message = await _save_chat_turn(chat_id, user_id, request.message, response.text)
         
         return {
             "chat_id": chat_id,
@@ -360,39 +573,131 @@ Answer:"""
             "ai_message": ai_message
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
         logging.error(f"Chat error: {str(e)}\n{error_details}")
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
 
+@api_router.post("/chat/send/stream")
+async def send_message_stream(request: SendMessageRequest, user_id: str = Depends(get_current_user)):
+    """
+    Send a message and stream the AI response as server-sent events
+    
+    Each event is a JSON object: {"chat_id", "delta"} for every piece of the
+    response, then {"chat_id", "done", "user_message", "ai_message"} once
+    the chat is saved, or {"chat_id", "error"} if generation fails.
+    """
+    try:
+        chat_id, prompt = await _prepare_chat(request, user_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Chat error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
+    
+    async def events():
+        parts = []
+        try:
+            async for chunk in await GEMINI_FLASH.generate_content_async(prompt, stream=True):
+                parts.append(chunk.text)
+                yield _sse_event({"chat_id": chat_id, "delta": chunk.text})
+            
+            # Saved only once the full response has arrived
+            user_message, ai_message = await _save_chat_turn(chat_id, user_id, request.message, "".join(parts))
+            yield _sse_event({
+                "chat_id": chat_id,
+                "done": True,
+                "user_message": user_message,
+                "ai_message": ai_message
+            })
+        except Exception as e:
+            logger.error(f"Chat stream error: {str(e)}")
+            yield _sse_event({"chat_id": chat_id, "error": f"Error generating response: {str(e)}"})
+    
+    # Stop proxies (e.g. nginx) from buffering the stream, which would hold
+    # back the first tokens until the whole response is generated
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.get("/chat/history")
-def get_chat_history(user_id: str = Depends(get_current_user)):
+async def get_chat_history(request: Request, response: Response, user_id: str = Depends(get_current_user)):
     """Get all chats for user"""
+    if is_test_user(user_id):
+        chats = sorted(
+            (chat for chat in _test_chats.values() if chat["user_id"] == user_id),
+            key=lambda chat: chat["updated_at"],
+            reverse=True
+        )
+        return [{key: chat[key] for key in ("id", "title", "updated_at", "created_at")} for chat in chats[:50]]
+    
     supabase = get_supabase()
-    res = supabase.table('chats').select("id, title, updated_at, created_at").eq("user_id", user_id).order("updated_at", desc=True).limit(50).execute()
+    
+    # The list only changes when a chat is added, updated or deleted, which
+    # the chat count and newest updated_at capture
+    latest = await supabase.table('chats').select("updated_at", count="exact").eq("user_id", user_id).order("updated_at", desc=True).limit(1).execute()
+    etag = make_etag(user_id, latest.count, latest.data[0]["updated_at"] if latest.data else "")
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+    
+    res = await supabase.table('chats').select("id, title, updated_at, created_at").eq("user_id", user_id).order("updated_at", desc=True).limit(50).execute()
     return res.data
 
+async def _fetch_chat(chat_id: str, user_id: str, columns: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a chat with its messages in order
+    
+    The chat row and its messages are queried concurrently; the messages
+    are discarded if the chat does not belong to the user.
+    
+    Returns:
+        The chat's columns plus a "messages" list, or None if not found
+    """
+    if is_test_user(user_id):
+        chat = _test_chats.get(chat_id)
+        if chat is None or chat["user_id"] != user_id:
+            return None
+        return {
+            **{column.strip(): chat[column.strip()] for column in columns.split(",")},
+            "messages": list(chat["messages"])
+        }
+    
+    supabase = get_supabase()
+    chat_res, messages_res = await asyncio.gather(
+        supabase.table('chats').select(columns).eq("id", chat_id).eq("user_id", user_id).execute(),
+        supabase.table('chat_messages').select("sender, content, timestamp:created_at").eq("chat_id", chat_id).order("id").execute()
+    )
+    if not chat_res.data:
+        return None
+    
+    chat = chat_res.data[0]
+    chat['messages'] = messages_res.data
+    return chat
+
 @api_router.get("/chat/{chat_id}")
-def get_chat(chat_id: str, user_id: str = Depends(get_current_user)):
+async def get_chat(chat_id: str, user_id: str = Depends(get_current_user)):
     """Get specific chat"""
-    supabase = get_supabase()
-    res = supabase.table('chats').select("*").eq("id", chat_id).eq("user_id", user_id).execute()
-    if not res.data:
+    chat = await _fetch_chat(chat_id, user_id, "id, user_id, title, created_at, updated_at")
+    if chat is None:
         raise HTTPException(status_code=404, detail="Chat not found")
-        
-    chat = res.data[0]
-    # Ensure messages is a list (Supabase might return it as list since it's JSONB, but good to be safe)
-    if isinstance(chat.get('messages'), str):
-         chat['messages'] = json.loads(chat['messages'])
-         
     return chat
 
 @api_router.delete("/chat/{chat_id}")
-def delete_chat(chat_id: str, user_id: str = Depends(get_current_user)):
+async def delete_chat(chat_id: str, user_id: str = Depends(get_current_user)):
     """Delete a chat"""
+    if is_test_user(user_id):
+        if chat_id in _test_chats and _test_chats[chat_id]["user_id"] == user_id:
+            del _test_chats[chat_id]
+        return {"message": "Chat deleted successfully"}
+    
     supabase = get_supabase()
-    res = supabase.table('chats').delete().eq("id", chat_id).eq("user_id", user_id).execute()
+    res = await supabase.table('chats').delete().eq("id", chat_id).eq("user_id", user_id).execute()
     # Check if delete was successful? Supabase delete returns data of deleted rows
     if not res.data:
          # It might mean it didn't exist or wasn't allowed, but we can just say success
@@ -401,40 +706,167 @@ def delete_chat(chat_id: str, user_id: str = Depends(get_current_user)):
 
 # ==================== DOCUMENT ENDPOINTS ====================
 
-@api_router.post("/documents/analyze")
-async def analyze_document(
-    file: UploadFile = File(...),
-    user_id: str = Depends(get_current_user)
-):
-    """Analyze a legal document - Note: This one remains async because of UploadFile reading"""
+# Static document analysis prompts
+VISION_ANALYSIS_PROMPT = """Analyze this legal document image (Indian Law context).
+Provide:
+1. Validated Text Content (Transcribed)
+2. Key Legal Points
+3. Risk Assessment (Low/Med/High) with Indian laws
+4. Suggestions
+5. Legal References"""
+ANALYSIS_PROMPT_PREFIX = """Analyze this legal document (Indian Law context):
+Document text: """
+ANALYSIS_PROMPT_SUFFIX = """
+Provide:
+1. Key Points
+2. Risk Assessment (Low/Med/High) with Indian laws
+3. Suggestions
+4. Legal References"""
+
+# Longer documents are analyzed in sections of about ANALYSIS_SECTION_CHARS,
+# up to MAX_ANALYSIS_SECTIONS of them and ANALYSIS_CONCURRENCY at a time;
+# the section notes are then combined into one analysis
+ANALYSIS_SECTION_CHARS = 8000
+MAX_ANALYSIS_SECTIONS = 8
+ANALYSIS_CONCURRENCY = 4
+SECTION_PROMPT_PREFIX = """Summarize this section of a legal document (Indian Law context).
+List its key points, obligations, risks and the Indian laws it refers to.
+Section text: """
+COMBINE_PROMPT_PREFIX = """Analyze this legal document (Indian Law context) using these notes on each of its sections:
+"""
+
+# Largest accepted upload, and the size of each read from the upload spool
+MAX_FILE_SIZE = int(os.environ.get('MAX_FILE_SIZE', 30 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Read an upload in chunks, rejecting it as soon as it exceeds MAX_FILE_SIZE
+    
+    Starlette has already spooled the upload to a temporary file, so an
+    oversized file is refused without ever being held in memory.
+    """
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="File too large")
+    
+    buffer = io.BytesIO()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        buffer.write(chunk)
+        if buffer.tell() > MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail="File too large")
+    return buffer.getvalue()
+
+async def read_body(request: Request) -> bytes:
+    """Stream a raw request body in, rejecting it as soon as it exceeds MAX_FILE_SIZE"""
+    declared_size = request.headers.get("content-length")
+    if declared_size and declared_size.isdigit() and int(declared_size) > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="File too large")
+    
+    buffer = io.BytesIO()
+    async for chunk in request.stream():
+        buffer.write(chunk)
+        if buffer.tell() > MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail="File too large")
+    return buffer.getvalue()
+
+def _chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> List[str]:
+    """Split text with the RAG chunker; failures give no chunks"""
+    try:
+        return get_rag_pipeline().chunk_text(text, chunk_size=chunk_size, overlap=overlap)
+    except Exception as e:
+        logger.warning(f"RAG chunking failed: {e}")
+        return []
+
+async def _index_document(chunks: Optional[List[str]], analysis_text: str, filename: str, user_id: str, doc_id: str):
+    """Add an analyzed document to the RAG index; best effort, failures are only logged"""
     try:
-        # Validate file type
-        if not validate_file_type(file.filename):
-            raise HTTPException(status_code=400, detail="Unsupported file type")
+        rag = get_rag_pipeline()
+        if chunks is None:
+            # Image: index the analysis/transcription instead of the placeholder text
+            chunks = await asyncio.to_thread(_chunk_text, analysis_text)
+        metadata = [
+            {"filename": filename, "user_id": user_id, "document_id": doc_id, "chunk_index": i}
+            for i in range(len(chunks))
+        ]
+        await rag.add_documents_async(chunks, metadata)
+    except Exception as e:
+        logger.warning(f"RAG indexing failed: {e}")
+
+async def _analyze_text(text: str) -> str:
+    """
+    Analyze extracted document text with Gemini
+    
+    Text that fits in one section is analyzed in a single call. Longer text
+    is split at sentence boundaries, the sections are summarized in
+    parallel, and a final call analyzes the combined notes.
+    
+    Returns:
+        The analysis text
+    """
+    sections = []
+    if len(text) > ANALYSIS_SECTION_CHARS:
+        sections = await asyncio.to_thread(
+            _chunk_text, text[:ANALYSIS_SECTION_CHARS * MAX_ANALYSIS_SECTIONS], ANALYSIS_SECTION_CHARS, 0
+        )
+    
+    if len(sections) < 2:
+        response = await GEMINI_FLASH.generate_content_async(
+            ANALYSIS_PROMPT_PREFIX + text[:ANALYSIS_SECTION_CHARS] + ANALYSIS_PROMPT_SUFFIX
+        )
+        return response.text
+    
+    semaphore = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+    
+    async def summarize(section: str) -> str:
+        async with semaphore:
+            response = await GEMINI_FLASH.generate_content_async(SECTION_PROMPT_PREFIX + section)
+            return response.text
+    
+    notes = await asyncio.gather(*map(summarize, sections))
+    prompt = COMBINE_PROMPT_PREFIX + "\n\n".join(
+        f"Section {i}:\n{note}" for i, note in enumerate(notes, 1)
+    ) + ANALYSIS_PROMPT_SUFFIX
+    response = await GEMINI_FLASH.generate_content_async(prompt)
+    return response.text
+
+async def _analyze_upload(
+    content: bytes,
+    filename: str,
+    content_type: Optional[str],
+    user_id: str,
+    background_tasks: Optional[BackgroundTasks] = None
+) -> Dict[str, Any]:
+    """
+    Analyze an uploaded legal document, save the result and index it for RAG
+    
+    Text extraction runs in a worker thread and Gemini and Supabase are
+    called through their async APIs, so concurrent uploads do not stall
+    the event loop.
+    
+    Args:
+        content: Raw file bytes
+        filename: Original file name, used to pick the extractor
+        content_type: MIME type sent by the client, if any
+        user_id: Owner of the document
+        background_tasks: If given, RAG indexing runs after the response is sent
         
-        content = await file.read()
-        file_type = file.filename.split('.')[-1].lower()
+    Returns:
+        Dict with the new document id, filename and analysis
+    """
+    try:
+        file_type = filename.split('.')[-1].lower()
         
-        # Initialize Gemini
-        model = genai.GenerativeModel('gemini-2.5-flash')
         analysis_text = ""
         extracted_text_preview = ""
+        chunks = None
         
         # Handle Images with Vision API
         if file_type in ['jpg', 'jpeg', 'png', 'bmp', 'tiff']:
             try:
                 # Create image part
-                image_parts = [{"mime_type": file.content_type or f"image/{file_type}", "data": content}]
-                
-                vision_prompt = """Analyze this legal document image (Indian Law context).
-Provide:
-1. Validated Text Content (Transcribed)
-2. Key Legal Points
-3. Risk Assessment (Low/Med/High) with Indian laws
-4. Suggestions
-5. Legal References"""
+                image_parts = [{"mime_type": content_type or f"image/{file_type}", "data": content}]
                 
-                response = model.generate_content([vision_prompt, image_parts[0]])
+                response = await GEMINI_FLASH.generate_content_async([VISION_ANALYSIS_PROMPT, image_parts[0]])
                 analysis_text = response.text
                 extracted_text_preview = "[Image Content Analyzed via Vision API]"
                 text = "Image content" # Placeholder for RAG indexing (optimally should be transcription)
@@ -444,23 +876,19 @@ Provide:
         
         else:
             # Handle Text/PDF
-            text = extract_text_from_file(content, file.filename)
+            # Extraction is CPU-bound (PDF parsing, OCR); keep it off the event loop
+            text = await asyncio.to_thread(extract_text_from_file, content, filename)
             
             if not text or len(text.strip()) < 10:
                 raise HTTPException(status_code=400, detail="Could not extract text. If this is a scanned PDF, please convert to Image or Text format.")
             
             extracted_text_preview = text[:2000] + "..." if len(text) > 2000 else text
             
-            prompt = f"""Analyze this legal document (Indian Law context):
-Document text: {text[:8000]}
-Provide:
-1. Key Points
-2. Risk Assessment (Low/Med/High) with Indian laws
-3. Suggestions
-4. Legal References"""
-            
-            response = model.generate_content(prompt)
-            analysis_text = response.text
+            # Chunk for the RAG index in a worker thread while Gemini analyzes
+            analysis_text, chunks = await asyncio.gather(
+                _analyze_text(text),
+                asyncio.to_thread(_chunk_text, text)
+            )
         
         analysis_result = {
             "extracted_text": text[:2000] + "..." if len(text) > 2000 else text,
@@ -469,36 +897,30 @@ Provide:
         }
         
         # Save to Supabase
-        doc_id = str(uuid.uuid4())
+        doc_id = new_id()
         new_doc = {
             "id": doc_id,
             "user_id": user_id,
-            "filename": file.filename,
+            "filename": filename,
             "file_type": file_type,
             "analysis_result": analysis_result,
             "uploaded_at": datetime.now(timezone.utc).isoformat()
         }
         
-        supabase = get_supabase()
-        supabase.table('documents').insert(new_doc).execute()
+        # Test accounts have no users row, so their documents are not saved
+        if not is_test_user(user_id):
+            supabase = get_supabase()
+            await supabase.table('documents').insert(new_doc).execute()
         
         # Index document in RAG (Local FAISS)
-        try:
-            rag = get_rag_pipeline()
-            # If text is placeholder (Image), index the analysis/transcription instead
-            text_to_index = analysis_text if text == "Image content" else text
-            chunks = rag.chunk_text(text_to_index)
-            metadata = [
-                {"filename": file.filename, "user_id": user_id, "document_id": doc_id, "chunk_index": i}
-                for i in range(len(chunks))
-            ]
-            rag.add_documents(chunks, metadata)
-        except Exception as e:
-            logger.warning(f"RAG indexing failed: {e}")
+        if background_tasks is not None:
+            background_tasks.add_task(_index_document, chunks, analysis_text, filename, user_id, doc_id)
+        else:
+            await _index_document(chunks, analysis_text, filename, user_id, doc_id)
             
         return {
             "id": doc_id,
-            "filename": file.filename,
+            "filename": filename,
             "analysis": analysis_result
         }
         
@@ -508,21 +930,133 @@ Provide:
         logger.error(f"Analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/documents/analyze")
+async def analyze_document(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_current_user)
+):
+    """Analyze a legal document uploaded as multipart form data"""
+    # Validate file type
+    if not validate_file_type(file.filename):
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    
+    content = await read_upload(file)
+    return await _analyze_upload(content, file.filename, file.content_type, user_id, background_tasks)
+
+# Queued analysis jobs: uploads are accepted immediately and analyzed by a
+# fixed number of worker tasks, so slow Gemini calls do not hold requests open.
+# Job state is kept per process and forgotten after ANALYSIS_JOB_TTL seconds.
+# Each queued job holds its upload in memory, so at most ANALYSIS_QUEUE_SIZE
+# jobs wait at once; further submissions get a 503 until the queue drains.
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', 4))
+ANALYSIS_QUEUE_SIZE = int(os.environ.get('ANALYSIS_QUEUE_SIZE', 32))
+ANALYSIS_JOB_TTL = 3600
+_analysis_jobs = TTLCache(maxsize=10000, ttl=ANALYSIS_JOB_TTL)
+_analysis_queue: Optional[asyncio.Queue] = None
+_analysis_worker_tasks: List[asyncio.Task] = []
+
+async def _analysis_worker():
+    """Process queued analysis jobs until cancelled"""
+    while True:
+        job_id, content, filename, content_type, user_id = await _analysis_queue.get()
+        job = _analysis_jobs.get(job_id, {"user_id": user_id})
+        job["status"] = "processing"
+        _analysis_jobs[job_id] = job
+        try:
+            job["result"] = await _analyze_upload(content, filename, content_type, user_id)
+            job["status"] = "completed"
+        except HTTPException as e:
+            job["status"] = "failed"
+            job["error"] = e.detail
+        except Exception as e:
+            logger.error(f"Analysis job {job_id} failed: {e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            _analysis_jobs[job_id] = job
+            _analysis_queue.task_done()
+
+@api_router.post("/documents/analyze/async", status_code=202)
+async def submit_document_analysis(
+    file: UploadFile = File(...),
+    user_id: str = Depends(get_current_user)
+):
+    """Queue a legal document for analysis; poll /documents/{job_id}/status for the result"""
+    # Validate file type
+    if not validate_file_type(file.filename):
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    if _analysis_queue is None:
+        raise HTTPException(status_code=503, detail="Analysis workers are not running")
+    
+    content = await read_upload(file)
+    job_id = new_id()
+    try:
+        _analysis_queue.put_nowait((job_id, content, file.filename, file.content_type, user_id))
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Analysis queue is full, please retry later")
+    _analysis_jobs[job_id] = {"user_id": user_id, "status": "queued"}
+    return {"job_id": job_id, "status": "queued"}
+
+@api_router.get("/documents/{job_id}/status")
+async def get_document_analysis_status(job_id: str, user_id: str = Depends(get_current_user)):
+    """Get the state of a queued analysis job, with the analysis once completed"""
+    job = _analysis_jobs.get(job_id)
+    if not job or job["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {key: value for key, value in job.items() if key != "user_id"} | {"job_id": job_id}
+
+@api_router.post("/documents/analyze/raw")
+async def analyze_document_raw(
+    background_tasks: BackgroundTasks,
+    request: Request,
+    filename: str,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Analyze a legal document sent as the raw request body
+    
+    Skips multipart form parsing entirely: the body is streamed in with
+    the same size limit. The file name is passed as a query parameter.
+    """
+    # Validate file type
+    if not validate_file_type(filename):
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    
+    content = await read_body(request)
+    content_type = request.headers.get("content-type", "")
+    return await _analyze_upload(
+        content, filename, content_type if content_type.startswith("image/") else None, user_id, background_tasks
+    )
+
 @api_router.get("/documents")
-def get_documents(user_id: str = Depends(get_current_user)):
+async def get_documents(request: Request, response: Response, user_id: str = Depends(get_current_user)):
     """Get user's documents"""
+    if is_test_user(user_id):
+        return []
+    
     supabase = get_supabase()
-    res = supabase.table('documents').select("id, filename, uploaded_at, file_type").eq("user_id", user_id).order("uploaded_at", desc=True).limit(50).execute()
+    
+    # Same scheme as /chat/history: document count and newest upload time
+    latest = await supabase.table('documents').select("uploaded_at", count="exact").eq("user_id", user_id).order("uploaded_at", desc=True).limit(1).execute()
+    etag = make_etag(user_id, latest.count, latest.data[0]["uploaded_at"] if latest.data else "")
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+    
+    res = await supabase.table('documents').select("id, filename, uploaded_at, file_type").eq("user_id", user_id).order("uploaded_at", desc=True).limit(50).execute()
     return res.data
 
 # ==================== RAG ENDPOINTS ====================
 
 @api_router.post("/rag/query")
-def rag_query(request: RAGQuery, user_id: str = Depends(get_current_user)):
+async def rag_query(request: RAGQuery, user_id: str = Depends(get_current_user)):
     """Query the local RAG pipeline"""
     try:
         rag = get_rag_pipeline()
-        results, answer = rag.query(query=request.query, top_k=request.top_k, use_rerank=request.use_rerank)
+        results, answer = await asyncio.to_thread(
+            rag.query, query=request.query, top_k=request.top_k, use_rerank=request.use_rerank
+        )
         
         sources = [
             {
@@ -538,73 +1072,76 @@ def rag_query(request: RAGQuery, user_id: str = Depends(get_current_user)):
         logger.error(f"RAG error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/rag/stats")
+async def rag_stats(user_id: str = Depends(get_current_user)):
+    """Get statistics of the local RAG index"""
+    return get_rag_pipeline().get_stats()
+
 # ==================== EXPORT ENDPOINTS ====================
 # Export endpoints access DB to get content, so update them
 @api_router.get("/chat/{chat_id}/export/{format}")
-def export_chat_endpoint(chat_id: str, format: str, user_id: str = Depends(get_current_user)):
-    supabase = get_supabase()
-    res = supabase.table('chats').select("*").eq("id", chat_id).eq("user_id", user_id).execute()
-    if not res.data:
+async def export_chat_endpoint(chat_id: str, format: str, user_id: str = Depends(get_current_user)):
+    chat_data = await _fetch_chat(chat_id, user_id, "title, created_at")
+    if chat_data is None:
         raise HTTPException(status_code=404, detail="Chat not found")
     
-    chat_data = res.data[0]
-    # Convert nicely to object for utility functions if needed, or update utils to handle dict
-    # Our utils expect Pydantic model or dict? Check export_utils.py. Usually dict access is safer if util supports it.
-    # We can wrap it in a simple object if needed.
-    class ChatObj:
-        def __init__(self, d):
-            self.id = d.get('id')
-            self.title = d.get('title')
-            self.messages = d.get('messages', [])
-            if isinstance(self.messages, str): self.messages = json.loads(self.messages)
-            # ensure messages utilize object access if util expects it? 
-            # Let's assume utils handle dicts or attributes. 
-            # To be safe, let's look at export_utils (not visible now but safer to pass dict if I change utils, or object)
-            # Actually, standard is to pass the data object. Let's pass the dict, but we might need to verify export_utils later.
-            
-    # For now, let's just implement the logic directly or wrap it?
-    # Simple trick: Use a class that behaves like pydantic model for getattr
-    # But for now, let's just try-catch.
-    
-    # We will rely on existing utils. If they fail, user will report. But most likely they iterate over .messages.
-    # If standard pydantic was used, it was obj.messages.
-    # So we need an object.
-    
-    chat_obj = ChatObj(chat_data)
-    
     if format == 'pdf':
-        content = export_chat_to_pdf(chat_obj)
+        content = await asyncio.to_thread(export_chat_to_pdf, chat_data)
         media_type = "application/pdf"
         filename = f"chat_{chat_id}.pdf"
     elif format == 'docx':
-        content = export_chat_to_docx(chat_obj)
+        content = await asyncio.to_thread(export_chat_to_docx, chat_data)
         media_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
         filename = f"chat_{chat_id}.docx"
     elif format == 'txt':
-        content = export_chat_to_txt(chat_obj)
-        media_type = "text/plain"
-        filename = f"chat_{chat_id}.txt"
+        # Text is streamed in large chunks as it is rendered, so the full
+        # export is never held in memory
+        return StreamingResponse(
+            stream_chat_to_txt(chat_data),
+            media_type="text/plain; charset=utf-8",
+            headers={"Content-Disposition": f"attachment; filename=chat_{chat_id}.txt"}
+        )
     else:
         raise HTTPException(status_code=400, detail="Invalid format")
-        
-    return StreamingResponse(
-        io.BytesIO(content if isinstance(content, bytes) else content.encode('utf-8')),
+    
+    # PDF and DOCX files are only valid once complete (the PDF cross-reference
+    # table and the DOCX zip directory come last), so they are sent as one body
+    return Response(
+        content=content,
         media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 # ==================== SYSTEM ENDPOINTS ====================
 
+# Seconds a /health database check is reused, so frequent load balancer
+# polls do not each query Supabase
+HEALTH_DB_TTL = 5
+_health_db_checked_at = float('-inf')
+_health_db_status = ""
+_health_db_lock = asyncio.Lock()
+
+async def _database_status() -> str:
+    """Query Supabase at most once per HEALTH_DB_TTL and describe the result"""
+    global _health_db_checked_at, _health_db_status
+    async with _health_db_lock:
+        if time.monotonic() - _health_db_checked_at < HEALTH_DB_TTL:
+            return _health_db_status
+        
+        try:
+            supabase = get_supabase()
+            await supabase.table('users').select("id").limit(1).execute()
+            _health_db_status = "connected"
+        except Exception as e:
+            _health_db_status = f"error: {str(e)}"
+        _health_db_checked_at = time.monotonic()
+        return _health_db_status
+
 @api_router.get("/health")
-def health_check():
+async def health_check():
     """Health check"""
     # Check supabase
-    try:
-        supabase = get_supabase()
-        supabase.table('users').select("id").limit(1).execute()
-        db_status = "connected"
-    except Exception as e:
-        db_status = f"error: {str(e)}"
+    db_status = await _database_status()
         
     return {
         "status": "ok",
@@ -613,10 +1150,49 @@ def health_check():
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
+@app.on_event("startup")
+async def check_database():
+    """Create the Supabase client and open a pooled connection before the first request"""
+    await connect_database()
+    if await ping_database():
+        logger.info("Supabase connection ready")
+
+@app.on_event("shutdown")
+async def close_database_connections():
+    """Release the pooled Supabase connections"""
+    await close_database()
+
+@app.on_event("startup")
+async def start_analysis_workers():
+    """Start the tasks that process queued document analysis jobs"""
+    global _analysis_queue
+    _analysis_queue = asyncio.Queue(maxsize=ANALYSIS_QUEUE_SIZE)
+    _analysis_worker_tasks.extend(
+        asyncio.create_task(_analysis_worker()) for _ in range(ANALYSIS_WORKERS)
+    )
+
+@app.on_event("shutdown")
+async def stop_analysis_workers():
+    """Cancel the analysis workers; jobs still queued are dropped"""
+    for task in _analysis_worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_analysis_worker_tasks, return_exceptions=True)
+    _analysis_worker_tasks.clear()
+
+@app.on_event("shutdown")
+async def stop_pdf_workers():
+    """Stop the PDF extraction processes"""
+    await asyncio.to_thread(shutdown_pdf_executor)
+
 app.include_router(api_router)
 
 # Middleware
-from middleware import RateLimitMiddleware, SecurityHeadersMiddleware, RequestLoggingMiddleware
+from middleware import (
+    RateLimitMiddleware, SecurityHeadersMiddleware, RequestLoggingMiddleware,
+    start_log_queue, stop_log_queue
+)
+app.add_event_handler("startup", start_log_queue)
+app.add_event_handler("shutdown", stop_log_queue)
 app.add_middleware(RequestLoggingMiddleware)
 app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(RateLimitMiddleware)
@@ -19,7 +19,6 @@ create table public.chats (
   id uuid primary key default uuid_generate_v4(),
   user_id uuid references public.users(id) on delete cascade,
   title text,
-  messages jsonb default '[]', -- Storing messages array as JSONB for flexibility
   created_at timestamp with time zone default timezone('utc'::text, now()),
   updated_at timestamp with time zone default timezone('utc'::text, now())
 );
@@ -34,12 +33,87 @@ create table public.documents (
   uploaded_at timestamp with time zone default timezone('utc'::text, now())
 );
 
+-- 4. Chat Messages Table
+-- One row per message, so a new turn is an insert instead of a rewrite of
+-- the whole conversation; id gives the message order within a chat
+create table public.chat_messages (
+  id bigint generated always as identity primary key,
+  chat_id uuid not null references public.chats(id) on delete cascade,
+  sender text not null,
+  content text,
+  created_at timestamp with time zone default timezone('utc'::text, now())
+);
+
+-- Indexes for the per-user listings (chat history, documents), which filter
+-- on user_id and sort by recency; ids and users.email are already indexed
+-- by their primary key / unique constraints
+create index if not exists chats_user_id_updated_at_idx on public.chats (user_id, updated_at desc);
+create index if not exists documents_user_id_uploaded_at_idx on public.documents (user_id, uploaded_at desc);
+-- Messages of a chat in order, and the latest ones for the prompt history
+create index if not exists chat_messages_chat_id_id_idx on public.chat_messages (chat_id, id);
+
 -- Enable Row Level Security (RLS)
 alter table public.users enable row level security;
 alter table public.chats enable row level security;
 alter table public.documents enable row level security;
+alter table public.chat_messages enable row level security;
 
 -- Create Policies
 create policy "Users can view their own data" on public.users for select using (auth.uid() = id);
 create policy "Users can view their own chats" on public.chats for all using (auth.uid() = user_id);
 create policy "Users can view their own documents" on public.documents for all using (auth.uid() = user_id);
+create policy "Users can view their own chat messages" on public.chat_messages for all using (
+  exists (select 1 from public.chats c where c.id = chat_id and c.user_id = auth.uid())
+);
+
+-- Functions
+-- Append messages to a chat and bump its updated_at; nothing is written if
+-- the chat does not belong to the user
+create or replace function public.append_chat_messages(p_chat_id uuid, p_user_id uuid, p_messages jsonb)
+returns void
+language sql
+as $$
+  with chat as (
+    update public.chats
+    set updated_at = timezone('utc'::text, now())
+    where id = p_chat_id and user_id = p_user_id
+    returning id
+  )
+  insert into public.chat_messages (chat_id, sender, content, created_at)
+  select chat.id,
+         m.value->>'sender',
+         m.value->>'content',
+         coalesce((m.value->>'timestamp')::timestamptz, timezone('utc'::text, now()))
+  from chat, jsonb_array_elements(p_messages) with ordinality as m(value, idx)
+  order by m.idx;
+$$;
+
+-- Last p_limit messages of a chat, or null if the chat does not exist
+create or replace function public.recent_chat_messages(p_chat_id uuid, p_user_id uuid, p_limit int)
+returns jsonb
+language sql
+stable
+as $$
+  select case when exists (
+    select 1 from public.chats where id = p_chat_id and user_id = p_user_id
+  ) then coalesce(
+    (select jsonb_agg(
+       jsonb_build_object('sender', r.sender, 'content', r.content, 'timestamp', r.created_at)
+       order by r.id)
+     from (select id, sender, content, created_at
+           from public.chat_messages
+           where chat_id = p_chat_id
+           order by id desc
+           limit p_limit) r),
+    '[]'::jsonb
+  ) end;
+$$;
+
+-- Migration for databases created with the chats.messages JSONB column:
+-- copy the messages into chat_messages, then drop the column.
+-- insert into public.chat_messages (chat_id, sender, content, created_at)
+-- select c.id, m.value->>'sender', m.value->>'content',
+--        coalesce((m.value->>'timestamp')::timestamptz, c.created_at)
+-- from public.chats c, jsonb_array_elements(c.messages) with ordinality as m(value, idx)
+-- order by c.created_at, c.id, m.idx;
+-- alter table public.chats drop column messages;
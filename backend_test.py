@@ -4,12 +4,15 @@ Comprehensive Backend Testing for Pleader AI
 Tests all backend functionality according to test_result.md
 """
 
-import requests
-import json
-import io
+import asyncio
+import functools
+import importlib.util
+import httpx
+import orjson
 import os
 from datetime import datetime
 import time
+from collections import deque
 
 # Configuration
 BASE_URL = "https://pleader-complete.preview.emergentagent.com/api"
@@ -19,20 +22,93 @@ TEST_USER = {
     "password": "TestPass123"
 }
 
+# Lease uploaded by test_document_analyze, encoded once
+TEST_DOCUMENT_NAME = "test_lease_agreement.txt"
+TEST_DOCUMENT = """
+        LEASE AGREEMENT
+        
+        This Lease Agreement ("Agreement") is entered into on January 1, 2025, between John Smith ("Landlord") and Jane Doe ("Tenant").
+        
+        1. PROPERTY: The Landlord agrees to lease to the Tenant the property located at 123 Main Street, Mumbai, Maharashtra.
+        
+        2. TERM: The lease term shall be for 12 months, commencing on January 1, 2025, and ending on December 31, 2025.
+        
+        3. RENT: The monthly rent shall be Rs. 25,000, payable on the 1st day of each month.
+        
+        4. SECURITY DEPOSIT: Tenant shall pay a security deposit of Rs. 50,000 upon signing this agreement.
+        
+        5. MAINTENANCE: Tenant is responsible for minor repairs and maintenance of the property.
+        
+        6. TERMINATION: Either party may terminate this lease with 30 days written notice.
+        
+        This agreement is governed by the laws of Maharashtra, India.
+""".encode('utf-8')
+
+# Headers of the JSON POSTs, built once; not a client default, since the
+# multipart upload needs its own Content-Type
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Errors kept per category, and characters kept per error, so a failing
+# endpoint returning a large body cannot bloat the run
+MAX_LOGGED_ERRORS = 50
+MAX_ERROR_CHARS = 500
+
+# Multiplex all requests over one HTTP/2 connection when h2 is installed
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+# Connections kept alive when the server only speaks HTTP/1.1
+POOL_KEEPALIVE = 20
+
+# Chat and document analysis wait on Gemini, so the timeout is generous
+TIMEOUT = 120
+
+def http_test(category, name):
+    """
+    Log the outcome and duration of an async test method
+    
+    The wrapped method returns None when its check passes, or a message
+    describing the failure; an exception counts as a failure too.
+    
+    Args:
+        category: Results category the test is counted under
+        name: Test name used in the log and the timings
+    """
+    def decorator(test):
+        @functools.wraps(test)
+        async def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                error = await test(self, *args, **kwargs)
+            except Exception as e:
+                error = str(e)
+            finally:
+                self.timings[name] = time.perf_counter() - start
+            self.log_result(category, name, error is None, error)
+            return error is None
+        return wrapper
+    return decorator
+
 class PleaderBackendTester:
     def __init__(self):
         self.base_url = BASE_URL
-        self.session = requests.Session()
+        # Shared httpx.AsyncClient, open while run_all_tests runs
+        self.client = None
         self.auth_token = None
         self.test_user_id = None
         self.test_chat_id = None
         self.test_document_id = None
+        # RAG index size before the test document was uploaded
+        self.indexed_before = None
+        # path -> (fetch time, response) of idempotent GETs, see cached_get
+        self._get_cache = {}
+        # Test name -> seconds taken, filled in by http_test
+        self.timings = {}
         self.results = {
-            "auth": {"passed": 0, "failed": 0, "errors": []},
-            "documents": {"passed": 0, "failed": 0, "errors": []},
-            "rag": {"passed": 0, "failed": 0, "errors": []},
-            "chat": {"passed": 0, "failed": 0, "errors": []},
-            "export": {"passed": 0, "failed": 0, "errors": []}
+            "auth": {"passed": 0, "failed": 0, "errors": deque(maxlen=MAX_LOGGED_ERRORS)},
+            "documents": {"passed": 0, "failed": 0, "errors": deque(maxlen=MAX_LOGGED_ERRORS)},
+            "rag": {"passed": 0, "failed": 0, "errors": deque(maxlen=MAX_LOGGED_ERRORS)},
+            "chat": {"passed": 0, "failed": 0, "errors": deque(maxlen=MAX_LOGGED_ERRORS)},
+            "export": {"passed": 0, "failed": 0, "errors": deque(maxlen=MAX_LOGGED_ERRORS)}
         }
     
     def log_result(self, category, test_name, success, error=None):
@@ -41,398 +117,331 @@ class PleaderBackendTester:
             self.results[category]["passed"] += 1
             print(f"✅ {test_name}")
         else:
+            error = str(error)[:MAX_ERROR_CHARS]
             self.results[category]["failed"] += 1
             self.results[category]["errors"].append(f"{test_name}: {error}")
             print(f"❌ {test_name}: {error}")
     
-    def test_auth_signup(self):
+    async def cached_get(self, path, ttl=30):
+        """GET a read-only endpoint, reusing a response fetched in the last ttl seconds"""
+        entry = self._get_cache.get(path)
+        if entry and time.monotonic() - entry[0] < ttl:
+            return entry[1]
+        response = await self.client.get(path)
+        self._get_cache[path] = (time.monotonic(), response)
+        return response
+    
+    @http_test("auth", "Signup")
+    async def test_auth_signup(self):
         """Test user signup"""
-        try:
-            response = self.session.post(
-                f"{self.base_url}/auth/signup",
-                json=TEST_USER,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "token" in data and "user" in data:
-                    self.auth_token = data["token"]
-                    self.test_user_id = data["user"]["id"]
-                    self.session.headers.update({"Authorization": f"Bearer {self.auth_token}"})
-                    self.log_result("auth", "Signup", True)
-                    return True
-                else:
-                    self.log_result("auth", "Signup", False, "Missing token or user in response")
-            elif response.status_code == 400 and "already registered" in response.text:
-                # User already exists, try login instead
-                return self.test_auth_login()
-            else:
-                self.log_result("auth", "Signup", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("auth", "Signup", False, str(e))
-        return False
+        response = await self.client.post(
+            "/auth/signup",
+            content=orjson.dumps(TEST_USER),
+            headers=JSON_HEADERS
+        )
+        
+        if response.status_code == 400 and "already registered" in response.text:
+            # User already exists, try login instead
+            return None if await self.test_auth_login() else "Existing user could not log in"
+        if response.status_code != 200:
+            return f"Status {response.status_code}: {response.text}"
+        return self.sign_in(orjson.loads(response.content))
     
-    def test_auth_login(self):
+    @http_test("auth", "Login")
+    async def test_auth_login(self):
         """Test user login"""
-        try:
-            response = self.session.post(
-                f"{self.base_url}/auth/login",
-                json={"email": TEST_USER["email"], "password": TEST_USER["password"]},
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "token" in data and "user" in data:
-                    self.auth_token = data["token"]
-                    self.test_user_id = data["user"]["id"]
-                    self.session.headers.update({"Authorization": f"Bearer {self.auth_token}"})
-                    self.log_result("auth", "Login", True)
-                    return True
-                else:
-                    self.log_result("auth", "Login", False, "Missing token or user in response")
-            else:
-                self.log_result("auth", "Login", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("auth", "Login", False, str(e))
-        return False
+        response = await self.client.post(
+            "/auth/login",
+            content=orjson.dumps({"email": TEST_USER["email"], "password": TEST_USER["password"]}),
+            headers=JSON_HEADERS
+        )
+        
+        if response.status_code != 200:
+            return f"Status {response.status_code}: {response.text}"
+        return self.sign_in(orjson.loads(response.content))
+    
+    def sign_in(self, data):
+        """Keep the token from a signup or login response for later requests"""
+        if "token" not in data or "user" not in data:
+            return "Missing token or user in response"
+        self.auth_token = data["token"]
+        self.test_user_id = data["user"]["id"]
+        self.client.headers.update({"Authorization": f"Bearer {self.auth_token}"})
+        return None
     
-    def test_auth_me(self):
+    @http_test("auth", "Get Me")
+    async def test_auth_me(self):
         """Test get current user"""
-        try:
-            response = self.session.get(f"{self.base_url}/auth/me")
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "id" in data and "email" in data:
-                    self.log_result("auth", "Get Me", True)
-                    return True
-                else:
-                    self.log_result("auth", "Get Me", False, "Missing user data in response")
-            else:
-                self.log_result("auth", "Get Me", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("auth", "Get Me", False, str(e))
-        return False
+        response = await self.cached_get("/auth/me")
+        
+        if response.status_code != 200:
+            return f"Status {response.status_code}: {response.text}"
+        data = orjson.loads(response.content)
+        if "id" not in data or "email" not in data:
+            return "Missing user data in response"
     
-    def test_auth_logout(self):
+    @http_test("auth", "Logout")
+    async def test_auth_logout(self):
         """Test user logout"""
-        try:
-            response = self.session.post(f"{self.base_url}/auth/logout")
-            
-            if response.status_code == 200:
-                self.log_result("auth", "Logout", True)
-                return True
-            else:
-                self.log_result("auth", "Logout", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("auth", "Logout", False, str(e))
-        return False
-    
-    def create_test_document(self):
-        """Create a test document for analysis"""
-        legal_text = """
-        LEASE AGREEMENT
-        
-        This Lease Agreement ("Agreement") is entered into on January 1, 2025, between John Smith ("Landlord") and Jane Doe ("Tenant").
-        
-        1. PROPERTY: The Landlord agrees to lease to the Tenant the property located at 123 Main Street, Mumbai, Maharashtra.
+        response = await self.client.post("/auth/logout")
         
-        2. TERM: The lease term shall be for 12 months, commencing on January 1, 2025, and ending on December 31, 2025.
+        if response.status_code != 200:
+            return f"Status {response.status_code}: {response.text}"
+    
+    @http_test("documents", "Document Analysis")
+    async def test_document_analyze(self):
+        """Test document analysis endpoint"""
+        files = {
+            'file': (TEST_DOCUMENT_NAME, TEST_DOCUMENT, 'text/plain')
+        }
         
-        3. RENT: The monthly rent shall be Rs. 25,000, payable on the 1st day of each month.
+        response = await self.client.post(
+            "/documents/analyze",
+            files=files
+        )
+        self._get_cache.clear()
         
-        4. SECURITY DEPOSIT: Tenant shall pay a security deposit of Rs. 50,000 upon signing this agreement.
-        
-        5. MAINTENANCE: Tenant is responsible for minor repairs and maintenance of the property.
+        if response.status_code != 200:
+            return f"Status {response.status_code}: {response.text}"
+        data = orjson.loads(response.content)
+        if "id" not in data or "analysis" not in data:
+            return "Missing id or analysis in response"
+        self.test_document_id = data["id"]
+        analysis = data["analysis"]
+        if "extracted_text" not in analysis or "full_analysis" not in analysis:
+            return "Missing analysis components"
+    
+    @http_test("rag", "RAG Query")
+    async def test_rag_query(self):
+        """Test RAG query endpoint"""
+        await self.wait_for_indexing()
         
-        6. TERMINATION: Either party may terminate this lease with 30 days written notice.
+        query_data = {
+            "query": "What is the monthly rent mentioned in the lease agreement?",
+            "top_k": 3,
+            "use_rerank": True
+        }
         
-        This agreement is governed by the laws of Maharashtra, India.
-        """
+        response = await self.client.post(
+            "/rag/query",
+            content=orjson.dumps(query_data),
+            headers=JSON_HEADERS
+        )
         
-        # Create a text file in memory
-        file_content = legal_text.encode('utf-8')
-        return file_content, "test_lease_agreement.txt"
+        if response.status_code != 200:
+            return f"Status {response.status_code}: {response.text}"
+        data = orjson.loads(response.content)
+        if "answer" not in data or "sources" not in data:
+            return "Missing answer or sources in response"
     
-    def test_document_analyze(self):
-        """Test document analysis endpoint"""
+    async def rag_document_count(self, cached=False):
+        """Number of chunks in the RAG index, or None if stats are unavailable"""
         try:
-            file_content, filename = self.create_test_document()
-            
-            files = {
-                'file': (filename, io.BytesIO(file_content), 'text/plain')
-            }
-            
-            response = self.session.post(
-                f"{self.base_url}/documents/analyze",
-                files=files
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "id" in data and "analysis" in data:
-                    self.test_document_id = data["id"]
-                    analysis = data["analysis"]
-                    if "extracted_text" in analysis and "full_analysis" in analysis:
-                        self.log_result("documents", "Document Analysis", True)
-                        return True
-                    else:
-                        self.log_result("documents", "Document Analysis", False, "Missing analysis components")
-                else:
-                    self.log_result("documents", "Document Analysis", False, "Missing id or analysis in response")
+            if cached:
+                response = await self.cached_get("/rag/stats")
             else:
-                self.log_result("documents", "Document Analysis", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("documents", "Document Analysis", False, str(e))
-        return False
-    
-    def test_rag_query(self):
-        """Test RAG query endpoint"""
-        try:
-            # Wait a moment for document indexing
-            time.sleep(2)
-            
-            query_data = {
-                "query": "What is the monthly rent mentioned in the lease agreement?",
-                "top_k": 3,
-                "use_rerank": True
-            }
-            
-            response = self.session.post(
-                f"{self.base_url}/rag/query",
-                json=query_data,
-                headers={"Content-Type": "application/json"}
-            )
-            
+                response = await self.client.get("/rag/stats")
             if response.status_code == 200:
-                data = response.json()
-                if "answer" in data and "sources" in data:
-                    self.log_result("rag", "RAG Query", True)
-                    return True
-                else:
-                    self.log_result("rag", "RAG Query", False, "Missing answer or sources in response")
-            else:
-                self.log_result("rag", "RAG Query", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("rag", "RAG Query", False, str(e))
-        return False
+                return orjson.loads(response.content).get("total_documents", 0)
+        except httpx.HTTPError:
+            pass
+        return None
+    
+    async def wait_for_indexing(self, timeout=10):
+        """Poll RAG stats until the test document is indexed or the timeout passes"""
+        if self.indexed_before is None:
+            return
+        
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            count = await self.rag_document_count()
+            if count is not None and count > self.indexed_before:
+                return
+            await asyncio.sleep(0.1)
     
-    def test_rag_stats(self):
+    @http_test("rag", "RAG Stats")
+    async def test_rag_stats(self):
         """Test RAG stats endpoint"""
-        try:
-            response = self.session.get(f"{self.base_url}/rag/stats")
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.log_result("rag", "RAG Stats", True)
-                return True
-            else:
-                self.log_result("rag", "RAG Stats", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("rag", "RAG Stats", False, str(e))
-        return False
+        response = await self.cached_get("/rag/stats")
+        
+        if response.status_code != 200:
+            return f"Status {response.status_code}: {response.text}"
+        # Raises, and so fails the test, unless the body is JSON
+        orjson.loads(response.content)
     
-    def test_chat_send(self):
+    @http_test("chat", "Send Message")
+    async def test_chat_send(self):
         """Test sending a chat message"""
-        try:
-            message_data = {
-                "message": "What are the key legal considerations when drafting a lease agreement in India?"
-            }
-            
-            response = self.session.post(
-                f"{self.base_url}/chat/send",
-                json=message_data,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "chat_id" in data and "ai_message" in data:
-                    self.test_chat_id = data["chat_id"]
-                    self.log_result("chat", "Send Message", True)
-                    return True
-                else:
-                    self.log_result("chat", "Send Message", False, "Missing chat_id or ai_message in response")
-            else:
-                self.log_result("chat", "Send Message", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("chat", "Send Message", False, str(e))
-        return False
+        message_data = {
+            "message": "What are the key legal considerations when drafting a lease agreement in India?"
+        }
+        
+        response = await self.client.post(
+            "/chat/send",
+            content=orjson.dumps(message_data),
+            headers=JSON_HEADERS
+        )
+        self._get_cache.clear()
+        
+        if response.status_code != 200:
+            return f"Status {response.status_code}: {response.text}"
+        data = orjson.loads(response.content)
+        if "chat_id" not in data or "ai_message" not in data:
+            return "Missing chat_id or ai_message in response"
+        self.test_chat_id = data["chat_id"]
     
-    def test_chat_history(self):
+    @http_test("chat", "Chat History")
+    async def test_chat_history(self):
         """Test getting chat history"""
-        try:
-            response = self.session.get(f"{self.base_url}/chat/history")
-            
-            if response.status_code == 200:
-                data = response.json()
-                if isinstance(data, list):
-                    self.log_result("chat", "Chat History", True)
-                    return True
-                else:
-                    self.log_result("chat", "Chat History", False, "Response is not a list")
-            else:
-                self.log_result("chat", "Chat History", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("chat", "Chat History", False, str(e))
-        return False
+        response = await self.client.get("/chat/history")
+        
+        if response.status_code != 200:
+            return f"Status {response.status_code}: {response.text}"
+        if not isinstance(orjson.loads(response.content), list):
+            return "Response is not a list"
     
-    def test_chat_get(self):
+    @http_test("chat", "Get Chat")
+    async def test_chat_get(self):
         """Test getting specific chat"""
         if not self.test_chat_id:
-            self.log_result("chat", "Get Chat", False, "No chat_id available")
-            return False
+            return "No chat_id available"
         
-        try:
-            response = self.session.get(f"{self.base_url}/chat/{self.test_chat_id}")
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "id" in data and "messages" in data:
-                    self.log_result("chat", "Get Chat", True)
-                    return True
-                else:
-                    self.log_result("chat", "Get Chat", False, "Missing id or messages in response")
-            else:
-                self.log_result("chat", "Get Chat", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("chat", "Get Chat", False, str(e))
-        return False
+        response = await self.client.get(f"/chat/{self.test_chat_id}")
+        
+        if response.status_code != 200:
+            return f"Status {response.status_code}: {response.text}"
+        data = orjson.loads(response.content)
+        if "id" not in data or "messages" not in data:
+            return "Missing id or messages in response"
     
-    def test_export_chat_pdf(self):
+    async def export_content_type(self, path):
+        """
+        Fetch an export and return its status and Content-Type
+        
+        Only the headers are checked, so the body is not downloaded.
+        """
+        async with self.client.stream("GET", path) as response:
+            if response.status_code != 200:
+                return f"Status {response.status_code} {response.reason_phrase}", None
+            return None, response.headers.get('content-type', '')
+    
+    @http_test("export", "Export Chat PDF")
+    async def test_export_chat_pdf(self):
         """Test exporting chat to PDF"""
         if not self.test_chat_id:
-            self.log_result("export", "Export Chat PDF", False, "No chat_id available")
-            return False
+            return "No chat_id available"
         
-        try:
-            response = self.session.get(f"{self.base_url}/chat/{self.test_chat_id}/export/pdf")
-            
-            if response.status_code == 200:
-                if response.headers.get('content-type') == 'application/pdf':
-                    self.log_result("export", "Export Chat PDF", True)
-                    return True
-                else:
-                    self.log_result("export", "Export Chat PDF", False, "Response is not PDF format")
-            else:
-                self.log_result("export", "Export Chat PDF", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("export", "Export Chat PDF", False, str(e))
-        return False
+        error, content_type = await self.export_content_type(f"/chat/{self.test_chat_id}/export/pdf")
+        if error:
+            return error
+        if content_type != 'application/pdf':
+            return "Response is not PDF format"
     
-    def test_export_chat_docx(self):
+    @http_test("export", "Export Chat DOCX")
+    async def test_export_chat_docx(self):
         """Test exporting chat to DOCX"""
         if not self.test_chat_id:
-            self.log_result("export", "Export Chat DOCX", False, "No chat_id available")
-            return False
+            return "No chat_id available"
         
-        try:
-            response = self.session.get(f"{self.base_url}/chat/{self.test_chat_id}/export/docx")
-            
-            if response.status_code == 200:
-                content_type = response.headers.get('content-type', '')
-                if 'officedocument.wordprocessingml.document' in content_type:
-                    self.log_result("export", "Export Chat DOCX", True)
-                    return True
-                else:
-                    self.log_result("export", "Export Chat DOCX", False, f"Unexpected content type: {content_type}")
-            else:
-                self.log_result("export", "Export Chat DOCX", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("export", "Export Chat DOCX", False, str(e))
-        return False
+        error, content_type = await self.export_content_type(f"/chat/{self.test_chat_id}/export/docx")
+        if error:
+            return error
+        if 'officedocument.wordprocessingml.document' not in content_type:
+            return f"Unexpected content type: {content_type}"
     
-    def test_export_chat_txt(self):
+    @http_test("export", "Export Chat TXT")
+    async def test_export_chat_txt(self):
         """Test exporting chat to TXT"""
         if not self.test_chat_id:
-            self.log_result("export", "Export Chat TXT", False, "No chat_id available")
-            return False
+            return "No chat_id available"
         
-        try:
-            response = self.session.get(f"{self.base_url}/chat/{self.test_chat_id}/export/txt")
-            
-            if response.status_code == 200:
-                if response.headers.get('content-type') == 'text/plain; charset=utf-8':
-                    self.log_result("export", "Export Chat TXT", True)
-                    return True
-                else:
-                    self.log_result("export", "Export Chat TXT", False, "Response is not text format")
-            else:
-                self.log_result("export", "Export Chat TXT", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("export", "Export Chat TXT", False, str(e))
-        return False
+        error, content_type = await self.export_content_type(f"/chat/{self.test_chat_id}/export/txt")
+        if error:
+            return error
+        if content_type != 'text/plain; charset=utf-8':
+            return "Response is not text format"
     
-    def test_export_document_pdf(self):
+    @http_test("export", "Export Document PDF")
+    async def test_export_document_pdf(self):
         """Test exporting document analysis to PDF"""
         if not self.test_document_id:
-            self.log_result("export", "Export Document PDF", False, "No document_id available")
-            return False
+            return "No document_id available"
         
-        try:
-            response = self.session.get(f"{self.base_url}/documents/{self.test_document_id}/export/pdf")
-            
-            if response.status_code == 200:
-                if response.headers.get('content-type') == 'application/pdf':
-                    self.log_result("export", "Export Document PDF", True)
-                    return True
-                else:
-                    self.log_result("export", "Export Document PDF", False, "Response is not PDF format")
-            else:
-                self.log_result("export", "Export Document PDF", False, f"Status {response.status_code}: {response.text}")
-        except Exception as e:
-            self.log_result("export", "Export Document PDF", False, str(e))
-        return False
+        error, content_type = await self.export_content_type(f"/documents/{self.test_document_id}/export/pdf")
+        if error:
+            return error
+        if content_type != 'application/pdf':
+            return "Response is not PDF format"
     
-    def run_all_tests(self):
+    async def run_stage(self, *tests):
+        """Run independent tests concurrently and wait for all of them"""
+        return await asyncio.gather(*(test() for test in tests))
+    
+    async def run_all_tests(self):
         """Run all backend tests"""
         print("🚀 Starting Pleader AI Backend Tests")
         print(f"📍 Testing against: {self.base_url}")
         print("=" * 60)
         
+        async with httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=TIMEOUT,
+            # Retries failed connection attempts only, never a sent request
+            transport=httpx.AsyncHTTPTransport(
+                http2=HTTP2,
+                limits=httpx.Limits(max_keepalive_connections=POOL_KEEPALIVE),
+                retries=3
+            )
+        ) as client:
+            self.client = client
+            return await self._run_stages()
+    
+    async def _run_stages(self):
+        """Run the test stages in dependency order on the open client"""
         # Authentication Tests
         print("\n🔐 AUTHENTICATION TESTS")
         print("-" * 30)
-        auth_success = self.test_auth_signup()
-        if auth_success:
-            self.test_auth_me()
-            # Don't logout yet, we need the token for other tests
-        
-        # Document Tests
-        print("\n📄 DOCUMENT TESTS")
-        print("-" * 30)
-        self.test_document_analyze()
+        auth_success = await self.test_auth_signup()
+        if not auth_success or not self.auth_token:
+            # Every other test needs the token and would only get a 401
+            print("\n⛔ Auth failed; aborting dependent tests")
+            return self.print_summary()
         
-        # RAG Tests
-        print("\n🧠 RAG TESTS")
-        print("-" * 30)
-        self.test_rag_query()
-        self.test_rag_stats()
+        # Cached, so test_rag_stats reuses this response
+        self.indexed_before = await self.rag_document_count(cached=True)
         
-        # Chat Tests
-        print("\n💬 CHAT TESTS")
+        # Independent once signed in; they create the document and chat
+        # the next stage reads
+        print("\n📄 DOCUMENT, RAG AND CHAT TESTS")
         print("-" * 30)
-        self.test_chat_send()
-        self.test_chat_history()
-        self.test_chat_get()
+        await self.run_stage(
+            self.test_auth_me,
+            self.test_document_analyze,
+            self.test_rag_stats,
+            self.test_chat_send
+        )
         
-        # Export Tests
-        print("\n📤 EXPORT TESTS")
+        # Reads of the indexed document and the new chat, and the exports
+        print("\n📤 QUERY, CHAT READ AND EXPORT TESTS")
         print("-" * 30)
-        self.test_export_chat_pdf()
-        self.test_export_chat_docx()
-        self.test_export_chat_txt()
-        self.test_export_document_pdf()
+        await self.run_stage(
+            self.test_rag_query,
+            self.test_chat_history,
+            self.test_chat_get,
+            self.test_export_chat_pdf,
+            self.test_export_chat_docx,
+            self.test_export_chat_txt,
+            self.test_export_document_pdf
+        )
         
+        # Don't logout until now, the other tests need the token
         # Final logout test
         print("\n🔐 FINAL AUTH TEST")
         print("-" * 30)
-        self.test_auth_logout()
+        await self.test_auth_logout()
         
         # Print Summary
-        self.print_summary()
+        return self.print_summary()
     
     def print_summary(self):
         """Print test summary"""
@@ -456,6 +465,11 @@ class PleaderBackendTester:
                 for error in results["errors"]:
                     print(f"   ❌ {error}")
         
+        print("-" * 60)
+        print("⏱️  TIMINGS")
+        for name, seconds in self.timings.items():
+            print(f"   {name}: {seconds * 1000:.0f} ms")
+        
         print("-" * 60)
         print(f"🎯 OVERALL: {total_passed} passed, {total_failed} failed")
         
@@ -468,5 +482,5 @@ class PleaderBackendTester:
 
 if __name__ == "__main__":
     tester = PleaderBackendTester()
-    success = tester.run_all_tests()
+    success = asyncio.run(tester.run_all_tests())
     exit(0 if success else 1)
\ No newline at end of file